@@ -1,30 +1,56 @@
 """Plugin to integrate InvenTree with Shopify."""
 
+import copy
 import datetime
+import json as json_pkg
+import logging
+import operator
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import reduce
+from hashlib import md5
+from itertools import islice
+from urllib.parse import urlencode
 
 from django import forms
 from django.conf.urls import url
-from django.http.response import Http404
+from django.contrib import messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection, transaction
+from django.db.models import Prefetch, Q
+from django.db.models.functions import Substr
+from django.http import HttpResponse
 from django.shortcuts import redirect, render
-from django.utils.translation import ugettext_lazy as _
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.translation import get_language, ugettext_lazy as _
 
+import requests
 from stock.models import StockItem
 
+from InvenTree.tasks import offload_task
 from plugin import InvenTreePlugin
 from plugin.mixins import (
     APICallMixin,
     AppMixin,
     EventMixin,
     NavigationMixin,
+    ScheduleMixin,
     SettingsMixin,
     UrlsMixin,
 )
+from plugin.registry import call_function
+
+logger = logging.getLogger("inventree")
 
 
 class ShopifyPlugin(
     EventMixin,
     APICallMixin,
     AppMixin,
+    ScheduleMixin,
     SettingsMixin,
     UrlsMixin,
     NavigationMixin,
@@ -43,140 +69,916 @@ class ShopifyPlugin(
     API_TOKEN_SETTING = "API_PASSWORD"  # noqa: S105
 
     SHOPIFY_API_VERSION = "2023-04"
+    SHOPIFY_GRAPHQL_API_VERSION = "2024-04"  # first with inventorySetQuantities
+    PAGE_LIMIT = 250  # maximum page size allowed by the REST Admin API
+    BULK_POLL_INTERVAL = 5  # seconds between status checks of bulk operations
+    OVERVIEW_PAGE_SIZE = 50
+    EXCERPT_LENGTH = 250  # characters of product descriptions in the overview
+    OVERVIEW_CACHE_TIMEOUT = 60 * 60
+    ID_CHUNK_SIZE = 50  # maximum number of ids in filters like inventory_item_ids
+
+    PUSH_FLUSH_SCHEDULE = "shopify:push-flush"
+    WEBHOOK_BATCH_SIZE = 100
+    WEBHOOK_RECONCILE_KEY = "shopify:webhook-reconcile"
+    # a crashed sync blocks the next for this long
+    SYNC_LOCK_TIMEOUT = datetime.timedelta(hours=6)
+    # the next delta sync starts this long before the last one, covers clock skew
+    SYNC_OVERLAP = datetime.timedelta(minutes=5)
+
+    # additional store this instance talks to, see `using`; None is the store
+    # configured in the settings
+    shop = None
+
+    SCHEDULED_TASKS = {
+        # the configured SYNC_INTERVAL is checked on every run
+        "sync": {
+            "func": "sync_scheduled",
+            "schedule": "I",
+            "minutes": 5,
+        },
+        # picks up queued pushes if a flush got lost
+        "push": {
+            "func": "flush_pushes",
+            "schedule": "I",
+            "minutes": 10,
+        },
+        # picks up queued webhook messages if a worker task got lost
+        "webhooks": {
+            "func": "process_webhook_queues",
+            "schedule": "I",
+            "minutes": 5,
+        },
+        "prune_webhooks": {
+            "func": "prune_webhooks",
+            "schedule": "D",
+        },
+        "reconcile_webhooks": {
+            "func": "reconcile_shop_webhooks",
+            "schedule": "D",
+        },
+    }
+
+    @property
+    def shop_url(self):
+        """Host of the store this instance talks to."""
+        return self.shop.url if self.shop else self.get_setting("SHOP_URL")
 
     @property
     def api_url(self):
         """Base URL definifion."""
-        return f'https://{self.get_setting("SHOP_URL")}/admin/api/{self.SHOPIFY_API_VERSION}'
+        return f"https://{self.shop_url}/admin/api/{self.SHOPIFY_API_VERSION}"
+
+    @property
+    def api_headers(self):
+        """Headers for API calls, with the token of the store."""
+        if not self.shop:
+            return super().api_headers
+        # the default headers carry the token of the configured store in two places
+        return {"Content-Type": "application/json", self.API_TOKEN: self.shop.token}
+
+    def using(self, shop):
+        """Get a copy of the plugin that talks to another store.
+
+        Args:
+            shop (Shop): The store, None for the store configured in the settings
+        """
+        plugin = copy.copy(self)
+        plugin.shop = shop
+        return plugin
+
+    def for_shop(self, shop_id=None):
+        """Get the plugin for the store with the primary key `shop_id`."""
+        from .models import Shop
+
+        if shop_id is None:
+            return self.using(None)
+        return self.using(Shop.objects.get(pk=shop_id))
+
+    def shops(self) -> list:
+        """Get the plugin for every active store, the configured one first."""
+        from .models import Shop
+
+        return [self.using(None)] + [
+            self.using(shop) for shop in Shop.objects.filter(active=True)
+        ]
+
+    def status_key(self, resource: str) -> str:
+        """Key of the sync status of a resource for the current store."""
+        return f"{resource}:{self.shop.pk}" if self.shop else resource
+
+    def api_call(
+        self,
+        endpoint: str,
+        method: str = "GET",
+        url_args: dict = None,
+        data=None,
+        json=None,
+        headers: dict = None,
+        simple_response: bool = True,
+        endpoint_is_url: bool = False,
+    ):
+        """Do an API call through the rate limited Shopify client.
+
+        Same interface as `APICallMixin.api_call`, but requests are paced to stay
+        within the rate limit of the shop and retried when throttled.
+        """
+        from .client import get_client
+
+        if url_args:
+            endpoint += self.api_build_url_args(url_args)
+
+        if headers is None:
+            headers = self.api_headers
+
+        if endpoint_is_url:
+            url = endpoint
+        else:
+            url = f"{self.api_url}/{endpoint.lstrip('/')}"
+
+        if data and json:
+            raise ValueError("You can either pass `data` or `json` to this function.")
+        if json:
+            data = json_pkg.dumps(json)
+
+        client = get_client(url, self._client_options)
+        response = client.request(method, url, headers=headers, data=data)
+        if simple_response:
+            return response.json()
+        return response
+
+    @property
+    def graphql_url(self):
+        """URL of the GraphQL Admin API."""
+        shop, version = self.shop_url, self.SHOPIFY_GRAPHQL_API_VERSION
+        return f"https://{shop}/admin/api/{version}/graphql.json"
+
+    def graphql(self, query: str, variables: dict = None, **kwargs) -> dict:
+        """Run a query against the GraphQL Admin API.
+
+        Additional kwargs are passed to `api_call`.
+        """
+        return self.api_call(
+            kwargs.pop("url", None) or self.graphql_url,
+            method="POST",
+            json={"query": query, "variables": variables or {}},
+            endpoint_is_url=True,
+            **kwargs,
+        )
+
+    def set_quantities(self, items, rejected: list = None):
+        """Set available quantities in Shopify with batched GraphQL mutations.
+
+        The batches are sized and paced by the query costs Shopify reports. Entries
+        that Shopify rejects are taken out and the rest of their batch is sent
+        again; batches with errors that concern the whole input are logged and
+        skipped.
+
+        Args:
+            items: Iterable of tuples starting with inventory item id, location id
+                and quantity; further elements are passed through
+            rejected (list): Collects (item, error messages) of rejected entries
+
+        Yields:
+            list: The items of every batch that was applied
+        """
+        from .graphql import BatchSizer, entry_errors
+
+        sizer = BatchSizer()
+        items = iter(items)
+        while batch := list(islice(items, sizer.next_size())):
+            while batch:
+                errors = self._set_quantities(batch, sizer)
+                if not errors:
+                    yield batch
+                    break
+                entries = entry_errors(errors)
+                if not entries or max(entries) >= len(batch):
+                    logger.error("Shopify rejected inventory quantities: %s", errors)
+                    break
+                for index, messages in sorted(entries.items()):
+                    item = batch[index]
+                    logger.error(
+                        "Shopify rejected the quantity of item %s at location %s: %s",
+                        item[0],
+                        item[1],
+                        messages,
+                    )
+                    if rejected is not None:
+                        rejected.append((item, messages))
+                batch = [item for i, item in enumerate(batch) if i not in entries]
+
+    def _set_quantities(self, batch: list, sizer) -> list:
+        """Send one `inventorySetQuantities` mutation, waiting out throttling.
+
+        Returns:
+            list: User errors of the mutation
+        """
+        from .graphql import SET_QUANTITIES, gid, is_throttled
+
+        variables = {
+            "input": {
+                "name": "available",
+                "reason": "correction",
+                "ignoreCompareQuantity": True,
+                "quantities": [
+                    {
+                        "inventoryItemId": gid("InventoryItem", item[0]),
+                        "locationId": gid("Location", item[1]),
+                        "quantity": int(item[2]),
+                    }
+                    for item in batch
+                ],
+            }
+        }
+        url, headers = self.graphql_url, self.api_headers
+        while True:
+            time.sleep(sizer.wait_time(len(batch)))
+            response = self.graphql(SET_QUANTITIES, variables, url=url, headers=headers)
+            sizer.update(response, len(batch))
+            if not is_throttled(response):
+                break
+            if not sizer.wait_time(len(batch)):
+                time.sleep(1)
+
+        if "errors" in response:
+            raise ValueError("Errors where found", response["errors"])
+        return response["data"]["inventorySetQuantities"]["userErrors"]
+
+    def _client_options(self):
+        return {
+            "pool_size": int(self.get_setting("HTTP_POOL_SIZE")),
+            "gzip": self.get_setting("HTTP_GZIP"),
+        }
+
+    def measure(self, name: str):
+        """Context manager that records the duration and API calls of a phase."""
+        from . import stats
+
+        return stats.phase(name, queries=self.get_setting("METRICS_QUERIES"))
+
+    def _paginate(self, endpoint, key, url_args=None, limit=PAGE_LIMIT, **kwargs):
+        """Yield the pages of a cursor paginated REST endpoint one by one.
+
+        Shopify returns the cursor for the next page in the `Link` header; only
+        `limit` and `page_info` are allowed on follow-up requests, the link already
+        contains both. Additional kwargs are passed to `api_call`.
+        """
+        url_args = {**(url_args or {}), "limit": [limit]}
+        response = self.api_call(
+            endpoint, url_args=url_args, simple_response=False, **kwargs
+        )
+        while True:
+            data = response.json()
+            if "errors" in data:
+                raise ValueError("Errors where found", data["errors"])
+            yield data[key]
+
+            next_url = response.links.get("next", {}).get("url")
+            if not next_url:
+                break
+            response = self.api_call(
+                next_url,
+                endpoint_is_url=True,
+                simple_response=False,
+                headers=kwargs.get("headers"),
+            )
+
+    def _paginate_chunked(self, endpoint, key, param, ids, url_args=None):
+        """Yield the pages for a list of ids that is split into chunks.
 
-    def _fetch_levels(self):
+        Shopify limits some id filters (like `inventory_item_ids`) to 50 entries.
+        The chunks are fetched concurrently by SYNC_WORKERS threads while the pages
+        are yielded in the calling thread, so database writes stay there. Only a
+        bounded number of chunks is fetched ahead of the consumer.
+        """
+        from . import stats
+        from .client import get_client
+
+        # resolve settings here, the worker threads should not touch the database
+        url = f"{self.api_url}/{endpoint}"
+        headers = self.api_headers
+        workers = max(int(self.get_setting("SYNC_WORKERS")), 1)
+        get_client(url, self._client_options)
+
+        @stats.bind
+        def fetch(chunk):
+            return list(
+                self._paginate(
+                    url,
+                    key,
+                    url_args={**(url_args or {}), param: chunk},
+                    endpoint_is_url=True,
+                    headers=headers,
+                )
+            )
+
+        chunks = (
+            ids[i : i + self.ID_CHUNK_SIZE]
+            for i in range(0, len(ids), self.ID_CHUNK_SIZE)
+        )
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(fetch, chunk))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def _fetch_levels(self, since=None):
+        """Fetch inventory levels, only those changed after `since` if it is set.
+
+        Without `since` all levels are fetched by inventory item and local levels
+        that Shopify does not know anymore are removed. With `since` the changed
+        levels are fetched by location, so the number of requests follows the
+        number of changes instead of the catalog size. Returns the newest
+        `updated_at` seen.
+        """
+        from . import generation
         from .models import InventoryLevel, Variant
+        from .sync import delete_missing, format_timestamp, latest_update, upsert_levels
 
-        levels = self.api_call(
+        if since:
+            locations = self.api_call("locations.json").get("locations", [])
+            param, ids = "location_ids", [location["id"] for location in locations]
+            url_args = {"updated_at_min": [format_timestamp(since)]}
+        else:
+            param, url_args = "inventory_item_ids", None
+            ids = list(
+                Variant.objects.filter(shop=self.shop).values_list(
+                    "inventory_item_id", flat=True
+                )
+            )
+        if not ids:
+            return None
+
+        watermark, seen = None, set()
+        for levels in self._paginate_chunked(
             "inventory_levels.json",
-            url_args={
-                "inventory_item_ids": [
-                    a.inventory_item_id for a in Variant.objects.all()
-                ]
-            },
-        )
-        if "errors" in levels:
-            raise ValueError("Errors where found", levels["errors"])
-        # create levels in db
-        levels = levels["inventory_levels"]
-        for level in levels:
-            lvl, _ = InventoryLevel.objects.get_or_create(
-                variant=Variant.objects.get(
-                    inventory_item_id=level.get("inventory_item_id")
+            "inventory_levels",
+            param,
+            ids,
+            url_args=url_args,
+        ):
+            upsert_levels(levels, shop=self.shop)
+            watermark = latest_update(levels, watermark)
+            if not since:
+                seen.update(
+                    (lvl["inventory_item_id"], lvl["location_id"]) for lvl in levels
+                )
+
+        if not since:
+            delete_missing(
+                InventoryLevel.objects.filter(shop=self.shop).values_list(
+                    "pk", "variant__inventory_item_id", "location_id"
                 ),
-                location_id=level.get("location_id"),
-                defaults={
-                    "available": level.get("available"),
-                },
+                seen,
             )
-            lvl.updated_at = datetime.datetime.fromisoformat(level.get("updated_at"))
-            lvl.available = level.get("available")
-            lvl.save()
+            generation.bump("levels")
+        return watermark
 
-    def _fetch_products(self):
-        from .models import Product, Variant
+    def _fetch_products(self, since=None, limit=PAGE_LIMIT):
+        """Fetch products, only those changed after `since` if it is set.
 
-        products = self.api_call("products.json")
-        if "errors" in products:
-            raise ValueError("Errors where found", products["errors"])
-        # create products in db
-        products = products["products"]
-        for product in products:
-            Product.objects.update_or_create(
-                id=product.get("id"),
-                defaults={
-                    "title": product.get("title"),
-                    "body_html": product.get("body_html"),
-                    "vendor": product.get("vendor"),
-                    "product_type": product.get("product_type"),
-                    "handle": product.get("handle"),
-                    "created_at": datetime.datetime.fromisoformat(
-                        product.get("created_at")
-                    ),
-                    "updated_at": datetime.datetime.fromisoformat(
-                        product.get("updated_at")
-                    ),
-                    "published_at": datetime.datetime.fromisoformat(
-                        product.get("published_at")
-                    ),
-                },
+        Without `since` the whole catalog is fetched and local products that were
+        deleted in Shopify are removed. Returns the newest `updated_at` seen.
+        """
+        from . import generation
+        from .models import Product
+        from .sync import (
+            delete_missing,
+            format_timestamp,
+            latest_update,
+            upsert_products,
+        )
+
+        url_args = {"updated_at_min": [format_timestamp(since)]} if since else None
+
+        # every page is written and dropped before the next one is requested
+        watermark, seen = None, set()
+        for products in self._paginate(
+            "products.json", "products", url_args=url_args, limit=limit
+        ):
+            upsert_products(products, shop=self.shop)
+            watermark = latest_update(products, watermark)
+            if not since:
+                seen.update((p["id"],) for p in products)
+
+        if not since:
+            delete_missing(
+                Product.objects.filter(shop=self.shop).values_list("pk", "pk"), seen
             )
+            # levels of deleted products are removed with them
+            generation.bump("products")
+            generation.bump("levels")
+        return watermark
 
-        # create variants in db
-        for p in products:
-            for var in p["variants"]:
-                if not Variant.objects.filter(
-                    inventory_item_id=var.get("inventory_item_id")
-                ).exists():
-                    Variant.objects.create(
-                        inventory_item_id=var.get("inventory_item_id"),
-                        title=var.get("title"),
-                        sku=var.get("sku"),
-                        barcode=var.get("barcode"),
-                        price=var.get("price"),
-                        created_at=datetime.datetime.fromisoformat(
-                            var.get("created_at")
-                        ),
-                        updated_at=datetime.datetime.fromisoformat(
-                            var.get("updated_at")
-                        ),
-                        product_id=p.get("id"),
-                    )
+    # region sync
+    def sync_all(self, full=False, shop_id=None):
+        """Sync the catalog and inventory levels from Shopify into the local tables.
+
+        Only changes since the last sync are requested, unless `full` is set or the
+        last full sync is older than FULL_SYNC_INTERVAL. One store is synced per
+        call, a store that is already syncing is skipped.
+
+        Args:
+            full (bool): Sync everything and remove items deleted in Shopify
+            shop_id (int): Primary key of the store, the current one if not set
+        """
+        from .models import SyncStatus
+
+        if shop_id is not None:
+            return self.for_shop(shop_id).sync_all(full=full)
+
+        lock = self.status_key("all")
+        if not SyncStatus.claim(lock, self.SYNC_LOCK_TIMEOUT):
+            logger.info("Shopify sync of %s is already running", self.shop_url)
+            return
+        try:
+            full_interval = datetime.timedelta(
+                hours=int(self.get_setting("FULL_SYNC_INTERVAL"))
+            )
+            started = timezone.now() - self.SYNC_OVERLAP
+            for resource, fetch in (
+                ("products", self._fetch_products),
+                ("levels", self._fetch_levels),
+            ):
+                status = SyncStatus.get(self.status_key(resource))
+                since = None if full else status.delta_start(full_interval)
+                with self.measure(f"fetch_{resource}"):
+                    watermark = fetch(since=since)
+                status.finish(watermark, full=since is None, started=started)
+        finally:
+            SyncStatus.release(lock)
+
+    def sync_shops(self, full=False):
+        """Start a sync of every active store in the background worker.
+
+        The stores are synced in parallel, each within its own rate limit.
+        """
+        for plugin in self.shops():
+            plugin.offload_sync(full=full)
+
+    def offload_sync(self, full=False):
+        """Start a sync of the current store in the background worker."""
+        shop_id = self.shop.pk if self.shop else None
+        offload_task(call_function, self.slug, "sync_all", full=full, shop_id=shop_id)
+
+    def sync_scheduled(self):
+        """Start a sync of every store whose sync interval has passed."""
+        from .models import SyncStatus
+
+        interval = datetime.timedelta(minutes=int(self.get_setting("SYNC_INTERVAL")))
+        for plugin in self.shops():
+            last_sync = SyncStatus.last(plugin.status_key("levels"))
+            if last_sync and last_sync + interval > timezone.now():
+                continue
+            plugin.offload_sync()
+
+    def bootstrap(self, lines=None):
+        """Import the whole catalog with a GraphQL bulk operation.
+
+        Much faster than paging through the REST API for the first sync of a large
+        store. Products with their variants and then the inventory levels are
+        exported by two bulk operations, each result file is streamed line by line
+        into the local tables.
+
+        Args:
+            lines: Iterable of JSONL lines to import instead of running the bulk
+                operations, e.g. an open file
+        """
+        from .graphql import BULK_LEVELS, BULK_PRODUCTS
+        from .models import SyncStatus
+        from .sync import import_bulk_lines
+
+        started = timezone.now() - self.SYNC_OVERLAP
+        if lines is not None:
+            watermarks = import_bulk_lines(lines, shop=self.shop)
+        else:
+            watermarks = {}
+            # levels are only stored for known variants, so products go first
+            for query in (BULK_PRODUCTS, BULK_LEVELS):
+                url = self._run_bulk_operation(query)
+                if not url:
+                    # nothing to export
+                    continue
+                with requests.get(url, stream=True, timeout=60) as response:
+                    response.raise_for_status()
+                    result = import_bulk_lines(response.iter_lines(), shop=self.shop)
+                watermarks.update({key: val for key, val in result.items() if val})
+
+        for resource in ("products", "levels"):
+            status = SyncStatus.get(self.status_key(resource))
+            status.finish(watermarks.get(resource), full=True, started=started)
+
+    def _run_bulk_operation(self, query: str):
+        from .graphql import CURRENT_BULK_OPERATION
+
+        response = self.graphql(query)
+        if "errors" in response:
+            raise ValueError("Errors where found", response["errors"])
+        errors = response["data"]["bulkOperationRunQuery"]["userErrors"]
+        if errors:
+            raise ValueError("Errors where found", errors)
+
+        while True:
+            time.sleep(self.BULK_POLL_INTERVAL)
+            response = self.graphql(CURRENT_BULK_OPERATION)
+            if "errors" in response:
+                raise ValueError("Errors where found", response["errors"])
+            operation = response["data"]["currentBulkOperation"]
+            if operation["status"] == "COMPLETED":
+                return operation["url"]
+            if operation["status"] not in ("CREATED", "RUNNING"):
+                raise ValueError("Bulk operation failed", operation)
+
+    def check_drift(self, fix: str = None, sample: int = 20) -> dict:
+        """Compare all Shopify inventory levels with the local state.
+
+        The local levels and stock quantities are loaded into one map, the Shopify
+        levels are streamed page by page against it; only drifted entries are
+        kept, so memory stays bounded by the number of local levels.
+
+        Args:
+            fix (str): `inventree` applies the Shopify quantities locally, `shopify`
+                pushes the stock quantities to Shopify; without it only a report
+                is made
+            sample (int): Number of drifted entries listed in the report
+
+        Returns:
+            dict: Counts of `checked` levels, levels whose copy of Shopify's
+            quantity (`level_drift`) or linked stock item (`stock_drift`) differs,
+            local levels `missing` in Shopify, `fixed` entries and a `sample` of
+            (inventory item id, location id, Shopify, level, stock) tuples
+        """
+        from .models import InventoryLevel, PendingPush, update_inventory_levels_bulk
+        from .sync import BATCH_SIZE
+
+        if fix not in (None, "inventree", "shopify"):
+            raise ValueError("Unknown fix direction", fix)
+
+        # levels with a queued push are about to change in Shopify
+        pending = set(PendingPush.objects.values_list("level_id", flat=True))
+        local = {
+            (row[0], row[1]): row[2:]
+            for row in InventoryLevel.objects.filter(shop=self.shop)
+            .exclude(pk__in=pending)
+            .values_list(
+                "variant__inventory_item_id",
+                "location_id",
+                "pk",
+                "available",
+                "stock_item_id",
+                "stock_item__quantity",
+            )
+            .iterator()
+        }
+        report = {
+            "checked": 0,
+            "level_drift": 0,
+            "stock_drift": 0,
+            "missing": 0,
+            "fixed": 0,
+            "sample": [],
+        }
+        to_inventree, to_shopify = [], []
+
+        def apply():
+            if to_inventree:
+                update_inventory_levels_bulk(to_inventree)
+            if to_shopify:
+                PendingPush.objects.bulk_create(to_shopify, ignore_conflicts=True)
+                self.flush_pushes()
+            report["fixed"] += len(to_inventree) + len(to_shopify)
+            to_inventree.clear()
+            to_shopify.clear()
+
+        ids = sorted({key[0] for key in local})
+        for levels in self._paginate_chunked(
+            "inventory_levels.json", "inventory_levels", "inventory_item_ids", ids
+        ):
+            for level in levels:
+                key = (level["inventory_item_id"], level["location_id"])
+                if key not in local:
+                    continue
+                pk, available, stock_item_id, quantity = local.pop(key)
+                report["checked"] += 1
+                remote = level.get("available") or 0
+                level_drift = available != remote
+                stock_drift = stock_item_id is not None and quantity != remote
+                if not (level_drift or stock_drift):
+                    continue
+                report["level_drift"] += level_drift
+                report["stock_drift"] += stock_drift
+                if len(report["sample"]) < sample:
+                    report["sample"].append((*key, remote, available, quantity))
+
+                if fix == "shopify" and stock_drift:
+                    to_shopify.append(PendingPush(level_id=pk, available=int(quantity)))
+                elif fix:
+                    payload = {**level, "available": remote}
+                    # without a timestamp the payload is never dropped as stale
+                    payload.pop("updated_at", None)
+                    to_inventree.append(payload)
+                if len(to_inventree) + len(to_shopify) >= BATCH_SIZE:
+                    apply()
+        apply()
+        report["missing"] = len(local)
+        return report
+
+    # endregion
 
     # region events
     def process_event(self, event, *args, **kwargs):
         """Process triggered events."""
+        from . import generation, stats
+        from .models import PendingPush
+
         if event == "stock_stockitem.saved" and kwargs.get("model", "") == "StockItem":
-            try:
-                stockitems = StockItem.objects.get(pk=kwargs.get("id"))
-                for level in stockitems.ShopifyInventoryLevel.all():
-                    if level.available == stockitems.quantity:
-                        continue
-                    response = self.api_call(
-                        endpoint="inventory_levels/set.json",
-                        json={
-                            "location_id": level.location_id,
-                            "inventory_item_id": level.variant.inventory_item_id,
-                            "available": int(stockitems.quantity),
-                        },
-                        method="POST",
-                    )
-                    if "inventory_level" in response:
-                        level.available = stockitems.quantity
-                        level.save()
+            with self.measure("process_event"):
+                try:
+                    stockitems = StockItem.objects.get(pk=kwargs.get("id"))
+                    queued, suppressed = False, 0
+                    levels = stockitems.ShopifyInventoryLevel.all()
+                    if levels:
+                        # the level overview shows the stock item
+                        generation.bump("levels")
+                    for level in levels:
+                        if level.available == stockitems.quantity:
+                            # Shopify has this quantity already, nothing to push
+                            reverted, _ = PendingPush.objects.filter(
+                                level=level
+                            ).delete()
+                            if not reverted:
+                                # mostly the echo of a change made in Shopify
+                                suppressed += 1
+                            continue
+                        # repeated saves only update the queued quantity
+                        PendingPush.objects.update_or_create(
+                            level=level,
+                            defaults={"available": int(stockitems.quantity)},
+                        )
+                        queued = True
+                    if queued:
+                        self._schedule_push()
+                    if suppressed:
+                        stats.incr("echo_suppressed", suppressed)
 
-            except StockItem.DoesNotExist:
-                pass
+                except StockItem.DoesNotExist:
+                    pass
+
+    def _schedule_push(self):
+        """Schedule a flush PUSH_DELAY seconds from now unless one is waiting.
+
+        The waiting flush collects everything queued until it runs. django-q removes
+        the one-off schedule when it starts the flush, so changes queued from then
+        on schedule a new one.
+        """
+        from django_q.models import Schedule
+
+        if Schedule.objects.filter(name=self.PUSH_FLUSH_SCHEDULE).exists():
+            return
+        delay = int(self.get_setting("PUSH_DELAY"))
+        Schedule.objects.create(
+            name=self.PUSH_FLUSH_SCHEDULE,
+            func="plugin.registry.call_function",
+            args=f"'{self.slug}', 'flush_pushes'",
+            schedule_type=Schedule.ONCE,
+            next_run=timezone.now() + datetime.timedelta(seconds=delay),
+        )
+
+    def flush_pushes(self):
+        """Push the queued stock levels to Shopify."""
+        from .models import PendingPush
+
+        with self.measure("push"):
+            by_shop = defaultdict(list)
+            for push in PendingPush.objects.select_related(
+                "level__variant", "level__shop"
+            ):
+                by_shop[push.level.shop].append(push)
+            for shop, pending in by_shop.items():
+                self._push(self.using(shop), pending)
+
+    def _push(self, plugin, pending: list):
+        """Push queued levels of one store and drop the pushed queue entries.
+
+        Entries that Shopify rejects, e.g. for an untracked item, are dropped too
+        so they do not block the queue; the next stock change queues them again.
+        """
+        from . import generation
+        from .models import InventoryLevel, PendingPush
+
+        rejected = []
+        for batch in plugin.set_quantities(
+            (
+                push.level.variant.inventory_item_id,
+                push.level.location_id,
+                push.available,
+                push,
+            )
+            for push in pending
+        ):
+            levels = []
+            for *_, push in batch:
+                push.level.available = push.available
+                levels.append(push.level)
+            InventoryLevel.objects.bulk_update(levels, ["available"])
+            generation.bump("levels")
+            # keep entries whose quantity changed while pushing
+            PendingPush.objects.filter(
+                reduce(
+                    operator.or_,
+                    (Q(pk=push.pk, available=push.available) for *_, push in batch),
+                )
+            ).delete()
+        if rejected:
+            PendingPush.objects.filter(
+                reduce(
+                    operator.or_,
+                    (
+                        Q(pk=push.pk, available=push.available)
+                        for (*_, push), _messages in rejected
+                    ),
+                )
+            ).delete()
+
+    def process_webhook_queue(self, shard: int):
+        """Process the queued webhook messages of one shard in order of arrival.
+
+        Every batch is applied and removed from the queue in one transaction that
+        holds the row lock of the shard, so only one worker drains a shard at a
+        time. Others return right away, or wait for the lock on databases that can
+        not skip locked rows.
+        """
+        from .models import QueuedWebhook, WebhookShard, process_webhook_batch
+
+        WebhookShard.objects.get_or_create(shard=shard)
+        skip_locked = connection.features.has_select_for_update_skip_locked
+        while True:
+            with transaction.atomic():
+                locked = WebhookShard.objects.select_for_update(skip_locked=skip_locked)
+                if not locked.filter(shard=shard):
+                    # another worker drains the shard
+                    return
+                batch = list(
+                    QueuedWebhook.objects.filter(shard=shard)
+                    .select_related("message", "shop")
+                    .order_by("pk")[: self.WEBHOOK_BATCH_SIZE]
+                )
+                if not batch:
+                    return
+                with self.measure("webhook"):
+                    process_webhook_batch(batch)
+                QueuedWebhook.objects.filter(
+                    pk__in=[item.pk for item in batch]
+                ).delete()
+
+    def prune_webhooks(self):
+        """Forget handled webhook ids that Shopify will not deliver again."""
+        from .models import ProcessedWebhook
+
+        ProcessedWebhook.prune(int(self.get_setting("WEBHOOK_DEDUP_DAYS")))
+
+    def process_webhook_queues(self):
+        """Process the queued webhook messages of all shards."""
+        from .models import QueuedWebhook
+
+        shards = QueuedWebhook.objects.values_list("shard", flat=True).distinct()
+        for shard in list(shards):
+            self.process_webhook_queue(shard)
 
     # endregion
 
     # region views
     def view_index(self, request):
-        """A basic overview view."""
-        from .models import InventoryLevel, Product
+        """A basic overview view.
 
-        try:
-            self._fetch_products()
-            self._fetch_levels()
-        except ValueError:
-            if request.user.is_superuser:
-                # TODO @matmair send a notification to superusers to fix setup
-                return redirect(self.settings_url)
-            raise Http404(_("Plugin is not configured correctly")) from None
+        The product and level lists are rendered from cache until a sync, webhook or
+        stock change alters the shown data, see `generation`.
+        """
+        from . import generation, stats
+        from .models import InventoryLevel, SyncStatus
+
+        search = request.GET.get("q", "").strip()
+        linked = request.GET.get("linked", "")
+        location = request.GET.get("location", "")
+        params = {"q": search, "linked": linked, "location": location}
+        pages = {"page": request.GET.get("page"), "lpage": request.GET.get("lpage")}
+        render_key = md5(  # noqa: S324
+            json_pkg.dumps([params, pages, get_language()]).encode()
+        ).hexdigest()
+        generations = generation.get_many(["products", "levels"])
+
+        def section(name, resources, build):
+            versions = ":".join(str(generations[r]) for r in resources)
+            key = f"shopify:overview:{name}:{versions}:{render_key}"
+            html = cache.get(key)
+            if html is None:
+                context = {
+                    **build(search, linked, location, pages),
+                    "query": urlencode({k: v for k, v in params.items() if v}),
+                }
+                html = render_to_string(f"shopify/{name}.html", context, request)
+                cache.set(key, html, self.OVERVIEW_CACHE_TIMEOUT)
+            return html
+
+        locations = cache.get_or_set(
+            f"shopify:overview:locations:{generations['levels']}",
+            lambda: list(
+                InventoryLevel.objects.values_list("location_id", flat=True)
+                .distinct()
+                .order_by("location_id")
+            ),
+            self.OVERVIEW_CACHE_TIMEOUT,
+        )
 
         context = {
-            "products": Product.objects.all(),
-            "levels": InventoryLevel.objects.all(),
+            "products_html": section("products", ["products"], self._overview_products),
+            # level rows show the product and variant titles too
+            "levels_html": section(
+                "levels", ["products", "levels"], self._overview_levels
+            ),
+            "locations": locations,
+            "filters": params,
+            "last_sync": SyncStatus.last("levels"),
+            "api_stats": stats.counters(),
         }
         return render(request, "shopify/index.html", context)
 
+    def _overview_products(self, search, linked, location, pages):
+        from .models import Product, Variant
+
+        variants = Variant.objects.select_related("part").order_by("pk")
+        products = (
+            Product.objects.prefetch_related(Prefetch("variants", queryset=variants))
+            # only the start of the description is shown
+            .annotate(
+                body_excerpt=Substr("description__body_html", 1, self.EXCERPT_LENGTH)
+            )
+            .order_by("title", "pk")
+        )
+
+        if search:
+            products = products.filter(
+                Q(title__icontains=search) | Q(variants__sku__icontains=search)
+            ).distinct()
+        if linked in ("yes", "no"):
+            products = products.filter(variants__part__isnull=linked == "no").distinct()
+
+        page = Paginator(products, self.OVERVIEW_PAGE_SIZE).get_page(pages["page"])
+        for p in page:
+            # fragments of unchanged products survive a new generation
+            shown = [p.title, p.vendor, p.product_type, p.body_excerpt] + [
+                (v.pk, v.title, v.sku, v.price, v.part_id) for v in p.variants.all()
+            ]
+            p.cache_version = md5(str(shown).encode()).hexdigest()  # noqa: S324
+        return {"products": page, "other_page": pages["lpage"] or 1}
+
+    def _overview_levels(self, search, linked, location, pages):
+        from .models import InventoryLevel
+
+        levels = InventoryLevel.objects.select_related(
+            "variant__product",
+            "stock_item__part",
+            "stock_item__location",
+            "stock_item__purchase_order",
+        ).order_by("variant__product__title", "variant__title", "location_id")
+
+        if search:
+            levels = levels.filter(
+                Q(variant__product__title__icontains=search)
+                | Q(variant__title__icontains=search)
+                | Q(variant__sku__icontains=search)
+            )
+        if linked in ("yes", "no"):
+            levels = levels.filter(stock_item__isnull=linked == "no")
+        if location.isdigit():
+            levels = levels.filter(location_id=int(location))
+
+        page = Paginator(levels, self.OVERVIEW_PAGE_SIZE).get_page(pages["lpage"])
+        for level in page:
+            item = level.stock_item
+            shown = [
+                level.available,
+                level.updated_at,
+                level.variant.title,
+                level.variant.product.title,
+                (item.pk, str(item), item.quantity) if item else None,
+            ]
+            level.cache_version = md5(str(shown).encode()).hexdigest()  # noqa: S324
+        return {"levels": page, "other_page": pages["page"] or 1}
+
+    def view_sync(self, request):
+        """Queue a sync with Shopify in the background worker."""
+        if request.method == "POST":
+            self.sync_shops()
+            messages.info(request, _("Sync with Shopify was started"))
+        return redirect(f"{self.internal_name}index")
+
     def view_increase(self, request, pk, location):
         """View for increasing the inventory level for an item."""
+        from .models import InventoryLevel
 
         class IncreaseForm(forms.Form):
             amount = forms.IntegerField(
@@ -193,8 +995,16 @@ class ShopifyPlugin(
             form = IncreaseForm(request.POST)
 
             if form.is_valid():
+                # the level belongs to the store it was synced from
+                shop_id = (
+                    InventoryLevel.objects.filter(
+                        variant__inventory_item_id=pk, location_id=location
+                    )
+                    .values_list("shop_id", flat=True)
+                    .first()
+                )
                 # increase stock
-                response = self.api_call(
+                response = self.for_shop(shop_id).api_call(
                     endpoint="inventory_levels/set.json",
                     json={
                         "location_id": location,
@@ -210,75 +1020,189 @@ class ShopifyPlugin(
         context["form"] = form
         return render(request, "shopify/increase.html", context)
 
+    def view_stats(self, request):
+        """Timings and API usage of the sync, push and webhook paths."""
+        from . import stats
+
+        phases = []
+        for name in stats.HISTOGRAMS:
+            hist = stats.histogram(name)
+            phases.append(
+                {
+                    "name": name,
+                    "count": hist["count"],
+                    "mean": hist["sum"] / hist["count"] if hist["count"] else None,
+                    "p50": stats.quantile(hist, 0.5),
+                    "p95": stats.quantile(hist, 0.95),
+                    **stats.phase_counters(name),
+                }
+            )
+        context = {
+            "phases": phases,
+            "api_stats": stats.counters(),
+            "shared": stats.is_shared(),
+        }
+        return render(request, "shopify/stats.html", context)
+
+    def view_metrics(self, request):
+        """All stats in the Prometheus text format."""
+        from . import stats
+
+        return HttpResponse(
+            stats.export(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
     def view_webhooks(self, request):
-        """View to check if the webhooks are set up correctly."""
-        context = {"webhooks": self._webhook_check(request.get_host())}
+        """View of the webhook endpoints, a reconciliation runs in the background."""
+        from .models import ShopifyWebhook
+
+        if cache.add(self.WEBHOOK_RECONCILE_KEY, True, timeout=60):
+            self.reconcile_shop_webhooks(host=request.get_host())
+        context = {
+            "webhooks": ShopifyWebhook.objects.select_related("shop").order_by(
+                "shop", "topic", "pk"
+            )
+        }
         return render(request, "shopify/webhooks.html", context)
 
-    def _webhook_check(self, host):
-        # collect current hooks
-        target_topics = [
-            "inventory_levels/update",
-            # 'orders/updated',
-            # 'orders/edited',
-        ]
-        webhooks = self.api_call("webhooks.json")
-        webhooks = webhooks.get("webhooks", [])
-
-        # process current hooks
-        webhooks_topics = []
-        webhooks_wrong_hooks = []
-        for item in webhooks:
-            if host in item.get("address", ""):
-                webhooks_topics.append(item.get("topic", ""))
+    def reconcile_shop_webhooks(self, host: str = None):
+        """Start a webhook reconciliation of every active store in the background."""
+        for plugin in self.shops():
+            offload_task(
+                call_function,
+                self.slug,
+                "reconcile_webhooks",
+                host=host,
+                shop_id=plugin.shop.pk if plugin.shop else None,
+            )
+
+    def reconcile_webhooks(self, host: str = None, shop_id: int = None):
+        """Bring the webhooks registered in Shopify into the desired state.
+
+        Every topic in `WEBHOOK_HANDLERS` gets one hook pointing to its local
+        endpoint. New hooks use WEBHOOK_HOST or else `host`; existing hooks are
+        only moved to another host if WEBHOOK_HOST is set. Hooks that were not
+        created by this plugin are left alone. The changes are applied
+        concurrently, endpoints that are not needed anymore are deleted.
+
+        Args:
+            host (str): Host for new hooks if WEBHOOK_HOST is not set
+            shop_id (int): Primary key of the store, the current one if not set
+
+        Returns:
+            dict: Number of created, updated and deleted hooks and failed calls
+        """
+        from .client import get_client
+        from .models import WEBHOOK_HANDLERS, ShopifyWebhook
+        from .webhooks import plan
+
+        if shop_id is not None:
+            return self.for_shop(shop_id).reconcile_webhooks(host=host)
+
+        configured = self.get_setting("WEBHOOK_HOST")
+        host = configured or host
+        topics = set(WEBHOOK_HANDLERS)
+
+        endpoints = list(ShopifyWebhook.objects.filter(shop=self.shop))
+        if host:
+            prefix = f"{self.slug}_{self.shop.pk}" if self.shop else self.slug
+            missing = topics - {endpoint.topic for endpoint in endpoints}
+            endpoints += [
+                ShopifyWebhook.objects.create(
+                    name=f"{prefix}_{topic}", topic=topic, shop=self.shop
+                )
+                for topic in sorted(missing)
+            ]
+        pages = self._paginate("webhooks.json", "webhooks")
+        hooks = [hook for page in pages for hook in page]
+        changes = plan(topics, endpoints, hooks, host, move=bool(configured))
+
+        # resolve settings here, the worker threads should not touch the database
+        base, headers = self.api_url, self.api_headers
+        workers = max(int(self.get_setting("SYNC_WORKERS")), 1)
+        get_client(base, self._client_options)
+
+        def call(endpoint, method="GET", **kwargs):
+            return self.api_call(
+                f"{base}/{endpoint}",
+                method=method,
+                headers=headers,
+                endpoint_is_url=True,
+                **kwargs,
+            )
+
+        def create(endpoint, address):
+            hook = {"topic": endpoint.topic, "address": address, "format": "json"}
+            return call("webhooks.json", "POST", json={"webhook": hook}).get("webhook")
+
+        def update(endpoint, hook_id, address):
+            hook = {"id": hook_id, "address": address}
+            response = call(f"webhooks/{hook_id}.json", "PUT", json={"webhook": hook})
+            return response.get("webhook")
+
+        def delete(hook_id):
+            response = call(f"webhooks/{hook_id}.json", "DELETE", simple_response=False)
+            # already removed in Shopify counts as done
+            return response.status_code in (200, 404)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            created = [
+                (args[0], pool.submit(create, *args)) for args in changes["create"]
+            ]
+            updated = [
+                (args[0], pool.submit(update, *args)) for args in changes["update"]
+            ]
+            deleted = [(pk, pool.submit(delete, pk)) for pk in changes["delete"]]
+
+        failed = 0
+        hooks = {hook["id"]: hook for hook in hooks}
+        for endpoint, future in created + updated:
+            try:
+                hook = future.result()
+            except Exception:
+                logger.exception("Shopify webhook for %s failed", endpoint.topic)
+                hook = None
+            if hook:
+                hooks[hook["id"]] = hook
+                endpoint.shopify_webhook_id = hook["id"]
             else:
-                hook_id = item.get("id", None)
-                if hook_id:
-                    webhooks_wrong_hooks.append(hook_id)
-        changed = False
-
-        # delete hooks
-        for item in webhooks_wrong_hooks:
-            self._webhook_delete(item)
-
-        # add hooks
-        for topic in target_topics:
-            if topic not in webhooks_topics:
-                self._webhook_create(host, topic)
-                changed = True
-
-        # return all hooks
-        if changed:
-            return self.api_call("webhooks.json")
-        return webhooks
-
-    def _webhook_create(self, hostname, topic):
-        from .models import ShopifyWebhook
+                failed += 1
 
-        webhook = ShopifyWebhook.objects.create(name=f"{self.slug}_{topic}")
-        response = self.api_call(
-            endpoint="webhooks.json",
-            json={
-                "webhook": {
-                    "topic": topic,
-                    "address": f"https://{hostname}/api/webhook/{webhook.endpoint_id}/",
-                    "format": "json",
-                }
-            },
-            method="POST",
-        )
-        if not response.get("webhook", False):
-            raise KeyError(response)
-        webhook.shopify_webhook_id = response["webhook"].get("id", None)
-        webhook.save()
-        return True
-
-    def _webhook_delete(self, _id):
-        self.api_call(
-            endpoint=f"webhooks/{_id}.json",
-            method="DELETE",
-        )
-        return True
+        kept_hooks = set()
+        for pk, future in deleted:
+            try:
+                done = future.result()
+            except Exception:
+                logger.exception("Deleting Shopify webhook %s failed", pk)
+                done = False
+            if not done:
+                failed += 1
+                kept_hooks.add(pk)
+
+        # endpoints are only removed once their hook is gone
+        stale = {
+            endpoint.pk
+            for endpoint in changes["stale"]
+            if endpoint.shopify_webhook_id not in kept_hooks
+        }
+        ShopifyWebhook.objects.filter(pk__in=stale).delete()
+        endpoints = [endpoint for endpoint in endpoints if endpoint.pk not in stale]
+        for endpoint in endpoints:
+            endpoint.address = hooks.get(endpoint.shopify_webhook_id, {}).get(
+                "address", ""
+            )
+        ShopifyWebhook.objects.bulk_update(endpoints, ["shopify_webhook_id", "address"])
+
+        if failed:
+            logger.error(
+                "%s Shopify webhook changes failed for %s", failed, self.shop_url
+            )
+        return {
+            "created": len(created),
+            "updated": len(updated),
+            "deleted": len(deleted),
+            "failed": failed,
+        }
 
     # endregion
 
@@ -291,6 +1215,9 @@ class ShopifyPlugin(
                 name="increase-level",
             ),
             url(r"webhook/", self.view_webhooks, name="webhooks"),
+            url(r"sync/", self.view_sync, name="sync"),
+            url(r"stats/", self.view_stats, name="stats"),
+            url(r"metrics/", self.view_metrics, name="metrics"),
             url(r"^", self.view_index, name="index"),
         ]
 
@@ -318,8 +1245,95 @@ class ShopifyPlugin(
             "default": "a shared key",
             "protected": True,
         },
+        "WEBHOOK_HOST": {
+            "name": _("Webhook host"),
+            "description": _(
+                "Public host name Shopify sends webhooks to, defaults to the host the "
+                "webhook page was opened with"
+            ),
+            "default": "",
+        },
+        "FULL_SYNC_INTERVAL": {
+            "name": _("Full sync interval"),
+            "description": _(
+                "Hours between full syncs that also remove items deleted in Shopify"
+            ),
+            "default": 24,
+            "validator": int,
+        },
+        "SYNC_WORKERS": {
+            "name": _("Sync workers"),
+            "description": _("Number of concurrent requests used during a sync"),
+            "default": 4,
+            "validator": int,
+        },
+        "HTTP_POOL_SIZE": {
+            "name": _("Connection pool size"),
+            "description": _(
+                "Connections to Shopify that are kept open per process (needs restart)"
+            ),
+            "default": 10,
+            "validator": int,
+        },
+        "HTTP_GZIP": {
+            "name": _("Compress responses"),
+            "description": _("Request gzip compressed responses from Shopify"),
+            "default": True,
+            "validator": bool,
+        },
+        "PUSH_DELAY": {
+            "name": _("Push delay"),
+            "description": _(
+                "Seconds stock changes are collected before they are pushed to "
+                "Shopify, the worker starts scheduled tasks about every 30 seconds"
+            ),
+            "default": 5,
+            "validator": int,
+        },
+        "WEBHOOK_ASYNC": {
+            "name": _("Process webhooks in background"),
+            "description": _(
+                "Answer webhooks right away and process them in the background worker"
+            ),
+            "default": False,
+            "validator": bool,
+        },
+        "WEBHOOK_WORKERS": {
+            "name": _("Webhook workers"),
+            "description": _(
+                "Number of background workers that process webhooks in parallel"
+            ),
+            "default": 4,
+            "validator": int,
+        },
+        "WEBHOOK_DEDUP_DAYS": {
+            "name": _("Webhook deduplication days"),
+            "description": _(
+                "Days handled webhook ids are kept to detect repeated deliveries"
+            ),
+            "default": 7,
+            "validator": int,
+        },
+        "SYNC_INTERVAL": {
+            "name": _("Sync interval"),
+            "description": _(
+                "Minutes between background syncs of products and inventory levels"
+            ),
+            "default": 60,
+            "validator": int,
+        },
+        "METRICS_QUERIES": {
+            "name": _("Count queries"),
+            "description": _(
+                "Count the database queries of syncs, pushes and webhooks in the "
+                "metrics, adds some overhead"
+            ),
+            "default": False,
+            "validator": bool,
+        },
     }
 
     NAVIGATION = [
         {"name": "Product overview", "link": "plugin:shopify:index"},
+        {"name": "Shopify stats", "link": "plugin:shopify:stats"},
     ]
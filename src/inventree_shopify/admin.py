@@ -5,7 +5,30 @@ from django.contrib import admin
 
 from import_export.admin import ImportExportModelAdmin
 
-from .models import InventoryLevel, Product, ShopifyWebhook, Variant
+from .models import (
+    InventoryLevel,
+    OrderLine,
+    PendingPush,
+    ProcessedWebhook,
+    Product,
+    ProductDescription,
+    QueuedWebhook,
+    Shop,
+    ShopifyWebhook,
+    SyncStatus,
+    Variant,
+    WebhookShard,
+)
+
+
+class ShopAdmin(admin.ModelAdmin):
+    """Admin interface for the Shop model."""
+
+    list_display = (
+        "name",
+        "url",
+        "active",
+    )
 
 
 class InventoryLevelAdmin(ImportExportModelAdmin):
@@ -19,7 +42,15 @@ class InventoryLevelAdmin(ImportExportModelAdmin):
     list_filter = ("location_id",)
 
 
+admin.site.register(Shop, ShopAdmin)
 admin.site.register(Product, ImportExportModelAdmin)
+admin.site.register(ProductDescription)
 admin.site.register(Variant, ImportExportModelAdmin)
 admin.site.register(InventoryLevel, InventoryLevelAdmin)
 admin.site.register(ShopifyWebhook, ImportExportModelAdmin)
+admin.site.register(SyncStatus)
+admin.site.register(PendingPush)
+admin.site.register(QueuedWebhook)
+admin.site.register(ProcessedWebhook)
+admin.site.register(OrderLine)
+admin.site.register(WebhookShard)
@@ -0,0 +1 @@
+"""Tools for benchmarking the Shopify integration without a live store."""
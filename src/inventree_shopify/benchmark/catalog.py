@@ -0,0 +1,117 @@
+"""Generated Shopify catalog data for the mock API."""
+
+import datetime
+import random
+
+START = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def timestamp(value: datetime.datetime) -> str:
+    """Format a timestamp like the REST API does."""
+    return value.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+
+
+class Catalog:
+    """Products, variants and inventory levels of a generated store.
+
+    Every variant is one inventory item with a level in every location. Changes
+    made through `touch`, `level_updates` or `set_quantity` get newer timestamps,
+    so incremental syncs pick them up.
+    """
+
+    PRODUCT_ID = 1_000_000
+    ITEM_ID = 5_000_000
+    LOCATION_ID = 9_000
+
+    def __init__(self, variants: int, per_product: int = 3, locations: int = 1):
+        """Generate a catalog.
+
+        Args:
+            variants (int): Number of variants (inventory items)
+            per_product (int): Variants per product
+            locations (int): Number of locations, every item is stocked in each
+        """
+        self.clock = START
+        self.random = random.Random(0)  # same data for every run
+        self.locations = [self.LOCATION_ID + i for i in range(locations)]
+        self.products = {}
+        self.variants = {}
+        self.levels = {}
+
+        created = timestamp(START)
+        for i in range(variants):
+            product_id = self.PRODUCT_ID + i // per_product
+            if product_id not in self.products:
+                self.products[product_id] = {
+                    "id": product_id,
+                    "title": f"Product {product_id}",
+                    "body_html": "",
+                    "vendor": "Mock",
+                    "product_type": "Benchmark",
+                    "handle": f"product-{product_id}",
+                    "created_at": created,
+                    "updated_at": created,
+                    "published_at": created,
+                    "variant_ids": [],
+                }
+            item_id = self.ITEM_ID + i
+            self.products[product_id]["variant_ids"].append(item_id)
+            self.variants[item_id] = {
+                "id": item_id,
+                "inventory_item_id": item_id,
+                "product_id": product_id,
+                "title": f"Variant {i % per_product}",
+                "sku": f"SKU-{item_id}",
+                "barcode": "",
+                "price": "9.99",
+                "created_at": created,
+                "updated_at": created,
+            }
+            for location_id in self.locations:
+                self.levels[(item_id, location_id)] = {
+                    "inventory_item_id": item_id,
+                    "location_id": location_id,
+                    "available": self.random.randint(0, 100),
+                    "updated_at": created,
+                }
+
+    def tick(self) -> str:
+        """Advance the store clock and return the new timestamp."""
+        self.clock += datetime.timedelta(seconds=1)
+        return timestamp(self.clock)
+
+    def product(self, product_id: int) -> dict:
+        """Get a product in the REST format, including its variants."""
+        product = dict(self.products[product_id])
+        product["variants"] = [self.variants[pk] for pk in product.pop("variant_ids")]
+        return product
+
+    def set_quantity(self, item_id: int, location_id: int, quantity: int) -> dict:
+        """Set the available quantity of a level."""
+        level = self.levels[(item_id, location_id)]
+        level["available"] = quantity
+        level["updated_at"] = self.tick()
+        return level
+
+    def touch(self, count: int):
+        """Change the title and one level of `count` random products."""
+        for product_id in self.random.sample(sorted(self.products), count):
+            now = self.tick()
+            product = self.products[product_id]
+            product["title"] = f"Product {product_id} ({now})"
+            product["updated_at"] = now
+            item_id = product["variant_ids"][0]
+            self.set_quantity(item_id, self.locations[0], self.random.randint(0, 100))
+
+    def level_updates(self, count: int) -> list:
+        """Change `count` random levels and return their webhook payloads.
+
+        Levels can be changed several times, like a burst on popular items.
+        """
+        keys = sorted(self.levels)
+        updates = []
+        for _ in range(count):
+            item_id, location_id = self.random.choice(keys)
+            quantity = self.random.randint(0, 100)
+            updates.append(dict(self.set_quantity(item_id, location_id, quantity)))
+        return updates
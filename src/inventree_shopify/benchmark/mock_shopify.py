@@ -0,0 +1,255 @@
+"""Local stand-in for the Shopify Admin API."""
+
+import base64
+import json
+import re
+import threading
+import time
+from bisect import bisect_right
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+ROUTE = re.compile(r"^/admin/api/[^/]+/(?P<resource>[a-z_/]+)\.json$")
+
+
+def _cursor(data: dict) -> str:
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+
+def _uncursor(value: str) -> dict:
+    return json.loads(base64.urlsafe_b64decode(value.encode()))
+
+
+def _normalize(value):
+    """Bring an `updated_at_min` argument into the format of the catalog."""
+    if not value:
+        return None
+    return value.replace("Z", "+00:00")
+
+
+class RateLimit:
+    """Leaky bucket like the one Shopify uses, one unit per request."""
+
+    def __init__(self, size: int):
+        """Create a bucket that leaks at the rate Shopify uses for its size."""
+        self.size = size
+        self.leak_rate = size / 20
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take a slot.
+
+        Returns:
+            tuple: Call limit header value and seconds to wait if the bucket is full
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+            self.updated = now
+            if self.level + 1 > self.size:
+                wait = (self.level + 1 - self.size) / self.leak_rate
+                return f"{self.size}/{self.size}", wait
+            self.level += 1
+            return f"{int(self.level)}/{self.size}", 0
+
+
+class MockShopifyHandler(BaseHTTPRequestHandler):
+    """Request handler that answers like the Shopify Admin API.
+
+    Products and inventory levels are served from the `catalog` of the server with
+    cursor pagination; requests beyond the rate limit are answered with 429.
+    """
+
+    protocol_version = "HTTP/1.1"  # allow keep-alive
+    disable_nagle_algorithm = True  # headers and body are written separately
+
+    def do_GET(self):  # noqa: N802
+        """Answer GET requests."""
+        if not self.rate_limit():
+            return
+        match = ROUTE.match(urlsplit(self.path).path)
+        resource = match["resource"] if match else None
+        if resource == "products":
+            self.send_page("products", self.products)
+        elif resource == "inventory_levels":
+            self.send_page("inventory_levels", self.inventory_levels)
+        elif resource == "locations":
+            locations = self.server.catalog.locations if self.server.catalog else []
+            self.send_json({"locations": [{"id": pk} for pk in locations]})
+        elif resource == "webhooks":
+            self.send_json({"webhooks": []})
+        else:
+            self.send_json({"shop": {"name": "mock"}})
+
+    def do_POST(self):  # noqa: N802
+        """Answer POST requests, only GraphQL quantity updates are supported."""
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if not self.rate_limit():
+            return
+        match = ROUTE.match(urlsplit(self.path).path)
+        if not match or match["resource"] != "graphql":
+            self.send_json({"errors": "Not Found"}, status=404)
+            return
+
+        quantities = body["variables"]["input"]["quantities"]
+        for entry in quantities:
+            self.server.catalog.set_quantity(
+                int(entry["inventoryItemId"].rsplit("/", 1)[-1]),
+                int(entry["locationId"].rsplit("/", 1)[-1]),
+                entry["quantity"],
+            )
+        cost = 10 + len(quantities)
+        self.send_json(
+            {
+                "data": {
+                    "inventorySetQuantities": {
+                        "inventoryAdjustmentGroup": {"id": "gid://shopify/Mock/1"},
+                        "userErrors": [],
+                    }
+                },
+                "extensions": {
+                    "cost": {
+                        "requestedQueryCost": cost,
+                        "actualQueryCost": cost,
+                        "throttleStatus": {
+                            "maximumAvailable": 1000.0,
+                            "currentlyAvailable": 1000 - cost,
+                            "restoreRate": 50.0,
+                        },
+                    }
+                },
+            }
+        )
+
+    def rate_limit(self) -> bool:
+        """Apply the rate limit, answers with 429 if the bucket is full."""
+        if self.server.rate_limit is None:
+            return True
+        self.call_limit, wait = self.server.rate_limit.take()
+        if wait:
+            self.send_json(
+                {"errors": "Exceeded 2 calls per second for api client."},
+                status=429,
+                headers={"Retry-After": f"{wait:.1f}"},
+            )
+            return False
+        return True
+
+    def products(self, args, after, limit):
+        """Products after the id `after`, in id order."""
+        catalog = self.server.catalog
+        since = _normalize(args.get("updated_at_min"))
+        ids = self.server.product_ids
+        items = []
+        for product_id in ids[bisect_right(ids, after or 0) :]:
+            product = catalog.products[product_id]
+            if since and product["updated_at"] < since:
+                continue
+            items.append(catalog.product(product_id))
+            if len(items) > limit:
+                break
+        return items, lambda item: item["id"]
+
+    def inventory_levels(self, args, after, limit):
+        """Levels of the requested inventory items or locations after `after`."""
+        catalog = self.server.catalog
+        since = _normalize(args.get("updated_at_min"))
+        if "inventory_item_ids" in args:
+            item_ids = sorted(int(pk) for pk in args["inventory_item_ids"].split(","))
+        else:
+            item_ids = sorted(catalog.variants)
+        location_ids = catalog.locations
+        if "location_ids" in args:
+            location_ids = sorted(int(pk) for pk in args["location_ids"].split(","))
+        after = tuple(after) if after else (0, 0)
+        items = []
+        for item_id in item_ids:
+            for location_id in location_ids:
+                key = (item_id, location_id)
+                level = catalog.levels.get(key)
+                if key <= after or level is None:
+                    continue
+                if since and level["updated_at"] < since:
+                    continue
+                items.append(level)
+        return items[: limit + 1], lambda item: [
+            item["inventory_item_id"],
+            item["location_id"],
+        ]
+
+    def send_page(self, key: str, query):
+        """Send one page of a cursor paginated resource.
+
+        Follow-up requests only carry `limit` and `page_info`, so the cursor holds
+        the filters of the first request.
+        """
+        url = urlsplit(self.path)
+        args = {name: values[0] for name, values in parse_qs(url.query).items()}
+        limit = min(int(args.get("limit", 50)), 250)
+        cursor = _uncursor(args["page_info"]) if "page_info" in args else {}
+        filters = cursor.get("filters", args)
+
+        items, cursor_key = query(filters, cursor.get("after"), limit)
+        headers = {}
+        if len(items) > limit:
+            items = items[:limit]
+            page_info = _cursor({"filters": filters, "after": cursor_key(items[-1])})
+            query_string = urlencode({"limit": limit, "page_info": page_info})
+            next_url = f"http://{self.headers['Host']}{url.path}?{query_string}"
+            headers["Link"] = f'<{next_url}>; rel="next"'
+        self.send_json({key: items}, headers=headers)
+
+    def send_json(self, payload, status: int = 200, headers: dict = None):
+        """Send a JSON response."""
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if getattr(self, "call_limit", None):
+            self.send_header("X-Shopify-Shop-Api-Call-Limit", self.call_limit)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):  # noqa: A002
+        """Keep the benchmark output clean."""
+
+
+class MockShopify:
+    """Runs the mock API in a background thread while used as a context manager."""
+
+    def __init__(self, catalog=None, bucket_size=None, handler=MockShopifyHandler):
+        """Prepare a server on a free local port.
+
+        Args:
+            catalog (Catalog): Store data that is served
+            bucket_size (int): Size of the rate limit bucket, it leaks at 1/20 of
+                its size per second like Shopify's; no rate limit if not set
+            handler: Request handler class
+        """
+        self.catalog = catalog
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.server.daemon_threads = True
+        self.server.catalog = catalog
+        self.server.product_ids = sorted(catalog.products) if catalog else []
+        self.server.rate_limit = RateLimit(bucket_size) if bucket_size else None
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        """Base url of the mock API."""
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        """Start serving."""
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        """Stop serving."""
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,61 @@
+"""Replay webhook messages against an InvenTree instance like Shopify sends them."""
+
+import base64
+import datetime
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .catalog import timestamp
+
+
+def signed_message(payload: dict, topic: str, secret: str):
+    """Build the body and headers of a webhook message.
+
+    Returns:
+        tuple: Encoded body and headers, including the HMAC signature
+    """
+    body = json.dumps(payload).encode()
+    digest = hmac.new(secret.encode(), body, hashlib.sha256).digest()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    return body, {
+        "Content-Type": "application/json",
+        "X-Shopify-Topic": topic,
+        "X-Shopify-Hmac-Sha256": base64.b64encode(digest).decode(),
+        "X-Shopify-Webhook-Id": str(uuid.uuid4()),
+        "X-Shopify-Triggered-At": timestamp(now),
+    }
+
+
+def replay(url: str, secret: str, payloads: list, topic: str, workers: int = 8):
+    """Send webhook messages concurrently, like a burst of changes in Shopify.
+
+    Args:
+        url (str): Webhook endpoint url, e.g. `https://host/api/webhook/<id>/`
+        secret (str): Shared secret the messages are signed with
+        payloads (list): Message payloads
+        topic (str): Topic of the messages
+        workers (int): Number of concurrent connections
+
+    Returns:
+        list: Seconds until each message was answered
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=workers)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    def send(payload):
+        body, headers = signed_message(payload, topic, secret)
+        start = time.perf_counter()
+        response = session.post(url, data=body, headers=headers, timeout=60)
+        response.raise_for_status()
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(send, payloads))
@@ -0,0 +1,183 @@
+"""HTTP client for the Shopify Admin API that keeps within the rate limit."""
+
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import stats
+
+logger = logging.getLogger("inventree")
+
+CALL_LIMIT_HEADER = "X-Shopify-Shop-Api-Call-Limit"
+
+
+class LeakyBucket:
+    """Client side model of the leaky bucket Shopify uses for rate limiting.
+
+    Every request adds one unit to the bucket which leaks at a fixed rate. The
+    bucket size is learned from the call limit header Shopify sends back; the
+    leak rate scales with it (40 requests leak at 2/s, 80 at 4/s for Plus stores).
+    """
+
+    HEADROOM = 2  # leave some room for other apps and manual calls
+
+    def __init__(self, size: int = 40):
+        """Create an empty bucket."""
+        self.size = size
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    @property
+    def leak_rate(self) -> float:
+        """Units that leak per second."""
+        return self.size / 20
+
+    def _leak(self):
+        now = time.monotonic()
+        self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+        self.updated = now
+
+    def acquire(self) -> float:
+        """Reserve a slot for a request, waiting until the bucket has room.
+
+        Returns:
+            float: Seconds that were waited
+        """
+        with self.lock:
+            self._leak()
+            overflow = self.level + 1 - (self.size - self.HEADROOM)
+            wait = max(overflow, 0) / self.leak_rate
+            self.level += 1
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def update(self, header: str):
+        """Sync the bucket with a call limit header like `32/40`."""
+        try:
+            used, size = (int(val) for val in header.split("/"))
+        except ValueError:
+            return
+        with self.lock:
+            self._leak()
+            self.size = size
+            # requests of other threads might still be in flight
+            self.level = max(self.level, float(used))
+
+    def fill(self):
+        """Mark the bucket as full, used after Shopify throttled a request."""
+        with self.lock:
+            self._leak()
+            self.level = float(self.size)
+
+
+class ShopifyClient:
+    """Rate limited client for one shop.
+
+    Requests are paced by a `LeakyBucket`. Throttled requests (HTTP 429) are
+    retried after the time given in `Retry-After`, server errors and connection
+    problems with an exponential backoff. Connections are kept alive in a pool
+    that is shared by all threads of the process.
+    """
+
+    MAX_RETRIES = 5
+    BACKOFF = 0.5  # seconds, doubled on every retry
+    TIMEOUT = 30
+
+    def __init__(self, pool_size: int = 10, gzip: bool = True):
+        """Create a client with an empty bucket and connection pool.
+
+        Args:
+            pool_size (int): Maximum number of connections kept open
+            gzip (bool): Ask for compressed responses
+        """
+        self.bucket = LeakyBucket()
+
+        self.session = requests.Session()
+        # retries are handled in `request`
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if not gzip:
+            self.session.headers["Accept-Encoding"] = "identity"
+
+    def _retry(self, attempt: int, wait: float):
+        stats.incr("api_retried")
+        logger.info("Shopify request is retried in %.1fs (attempt %s)", wait, attempt)
+        time.sleep(wait)
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """Send a request, waiting for the rate limit and retrying if needed.
+
+        Args:
+            method (str): HTTP method
+            url (str): Full url of the request
+            **kwargs: Passed to `requests.Session.request`
+
+        Returns:
+            requests.Response: Last response received
+        """
+        kwargs.setdefault("timeout", self.TIMEOUT)
+        for attempt in range(self.MAX_RETRIES + 1):
+            last_try = attempt == self.MAX_RETRIES
+            backoff = self.BACKOFF * 2**attempt
+
+            self.bucket.acquire()
+            stats.incr("api_requests")
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if last_try:
+                    raise
+                self._retry(attempt + 1, backoff)
+                continue
+            stats.observe("api", response.elapsed.total_seconds())
+
+            limit = response.headers.get(CALL_LIMIT_HEADER)
+            if limit:
+                self.bucket.update(limit)
+
+            if response.status_code == 429:
+                stats.incr("api_throttled")
+                self.bucket.fill()
+                if last_try:
+                    return response
+                try:
+                    wait = float(response.headers.get("Retry-After", backoff))
+                except ValueError:
+                    wait = backoff
+                self._retry(attempt + 1, wait)
+                continue
+
+            if response.status_code >= 500 and not last_try:
+                self._retry(attempt + 1, backoff)
+                continue
+
+            return response
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str, options=None) -> ShopifyClient:
+    """Get the client for the shop an url belongs to.
+
+    There is one client per shop and process, so all threads share the rate limit
+    budget and the connection pool.
+
+    Args:
+        url (str): Any url of the shop
+        options (callable): Returns the kwargs for a new `ShopifyClient`, only called
+            when the client is created
+    """
+    host = urlsplit(url).netloc
+    with _clients_lock:
+        if host not in _clients:
+            _clients[host] = ShopifyClient(**(options() if options else {}))
+        return _clients[host]
@@ -0,0 +1,40 @@
+"""Generation counters for the synced data.
+
+Every write to products/variants or inventory levels bumps the counter of that
+resource; cached renderings that include the counter in their key become stale.
+The counters are stored on the `SyncStatus` row of the resource, so the web
+process sees the bumps made in the background workers.
+"""
+
+from django.db import transaction
+from django.db.models import F
+
+
+def get_many(resources: list) -> dict:
+    """Get the current generation of resources (`products` or `levels`)."""
+    from .models import SyncStatus
+
+    values = dict(
+        SyncStatus.objects.filter(resource__in=resources).values_list(
+            "resource", "generation"
+        )
+    )
+    # no row yet, the first bump creates it with a higher value
+    return {resource: values.get(resource, 0) for resource in resources}
+
+
+def bump(resource: str):
+    """Mark the cached renderings of a resource as stale.
+
+    The counter is increased once the current transaction is committed, so the row
+    is only locked briefly and no rendering is cached from uncommitted data.
+    """
+    transaction.on_commit(lambda: _increase(resource))
+
+
+def _increase(resource: str):
+    from .models import SyncStatus
+
+    status = SyncStatus.objects.filter(resource=resource)
+    if not status.update(generation=F("generation") + 1):
+        SyncStatus.objects.get_or_create(resource=resource)
@@ -0,0 +1,139 @@
+"""Helpers for the Shopify GraphQL Admin API."""
+
+SET_QUANTITIES = """
+mutation inventorySetQuantities($input: InventorySetQuantitiesInput!) {
+  inventorySetQuantities(input: $input) {
+    inventoryAdjustmentGroup { id }
+    userErrors { field message }
+  }
+}
+"""
+
+
+def gid(kind: str, id) -> str:  # noqa: A002
+    """Build a global id like `gid://shopify/Location/123` from a REST id."""
+    return f"gid://shopify/{kind}/{id}"
+
+
+def is_throttled(response: dict) -> bool:
+    """Check if a GraphQL response was rejected because of the rate limit."""
+    return any(
+        err.get("extensions", {}).get("code") == "THROTTLED"
+        for err in response.get("errors", [])
+    )
+
+
+def entry_errors(errors: list) -> dict:
+    """Group user errors by the position of the `quantities` entry they point to.
+
+    The `field` of an entry error is like `["input", "quantities", "3", "locationId"]`.
+
+    Returns:
+        dict: Error messages by entry index, empty if an error concerns the whole
+        input
+    """
+    entries = {}
+    for err in errors:
+        field = err.get("field") or []
+        if len(field) < 3 or field[1] != "quantities" or not str(field[2]).isdigit():
+            return {}
+        entries.setdefault(int(field[2]), []).append(err.get("message"))
+    return entries
+
+
+class BatchSizer:
+    """Sizes batches for a mutation by the query cost Shopify reports.
+
+    The cost extension of every response tells how many points a batch cost and
+    how many are still available in the bucket. Batches are as large as the single
+    query cost and input size limits allow; before sending one the caller waits
+    until the bucket has restored enough points for it.
+    """
+
+    MAX_ITEMS = 250  # maximum length of list inputs
+    MAX_COST = 1000  # maximum cost of a single query
+
+    def __init__(self, size: int = 50):
+        """Start with `size` items until the first cost report is in."""
+        self.size = size
+        self.item_cost = None
+        self.available = None
+        self.restore_rate = None
+
+    def update(self, response: dict, items: int):
+        """Read the cost extension of a response for a batch of `items`."""
+        cost = response.get("extensions", {}).get("cost", {})
+        spent = cost.get("actualQueryCost") or cost.get("requestedQueryCost")
+        if spent and items:
+            self.item_cost = spent / items
+        throttle = cost.get("throttleStatus", {})
+        self.available = throttle.get("currentlyAvailable", self.available)
+        self.restore_rate = throttle.get("restoreRate", self.restore_rate)
+
+    def next_size(self) -> int:
+        """Number of items for the next batch."""
+        if not self.item_cost:
+            return self.size
+        return max(1, min(self.MAX_ITEMS, int(self.MAX_COST // self.item_cost)))
+
+    def wait_time(self, size: int) -> float:
+        """Seconds until the bucket holds enough points for a batch of `size`."""
+        if not self.item_cost or self.available is None or not self.restore_rate:
+            return 0
+        missing = size * self.item_cost - self.available
+        return max(missing, 0) / self.restore_rate
+
+
+# bulk queries allow two levels of connections and one operation runs at a time
+# per store, so the catalog is exported with two operations one after the other
+BULK_PRODUCTS = '''
+mutation {
+  bulkOperationRunQuery(query: """
+    {
+      products {
+        edges { node {
+          id title descriptionHtml vendor productType handle
+          createdAt updatedAt publishedAt
+          variants { edges { node {
+            id title sku barcode price createdAt updatedAt
+            product { id }
+            inventoryItem { id }
+          } } }
+        } }
+      }
+    }
+  """) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+BULK_LEVELS = '''
+mutation {
+  bulkOperationRunQuery(query: """
+    {
+      inventoryItems {
+        edges { node {
+          id
+          inventoryLevels { edges { node {
+            id updatedAt
+            item { id }
+            location { id }
+            quantities(names: ["available"]) { name quantity }
+          } } }
+        } }
+      }
+    }
+  """) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+'''
+
+CURRENT_BULK_OPERATION = """
+{
+  currentBulkOperation { id status errorCode objectCount url }
+}
+"""
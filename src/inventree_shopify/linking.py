@@ -0,0 +1,209 @@
+"""Automatic linking of Shopify variants and levels to InvenTree parts and stock.
+
+Variants are matched by SKU and barcode against the IPN, supplier SKUs and barcode
+of parts. Levels of linked variants are matched to the single in-stock item of the
+part in the stock location whose metadata carries the Shopify location id
+(`shopify_location_id`). All lookups use in-memory indexes that are built with
+one query each, so the whole catalog is matched in one pass.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from company.models import SupplierPart
+from part.models import Part
+from stock.models import StockItem, StockLocation
+
+from . import generation
+from .models import InventoryLevel, Variant
+
+BATCH_SIZE = 500
+LOCATION_KEY = "shopify_location_id"
+
+
+def normalize(value) -> str:
+    """Normalize a SKU or barcode for matching."""
+    return str(value or "").strip().upper()
+
+
+def _unique(candidates: dict):
+    """Split a key -> set of ids mapping into unique matches and ambiguous keys."""
+    index, ambiguous = {}, set()
+    for key, ids in candidates.items():
+        if len(ids) == 1:
+            index[key] = next(iter(ids))
+        else:
+            ambiguous.add(key)
+    return index, ambiguous
+
+
+def part_index():
+    """Index parts by IPN, supplier SKU and barcode.
+
+    Returns:
+        tuple: Part id by normalized key and the set of keys used by several parts
+    """
+    candidates = defaultdict(set)
+    sources = (
+        Part.objects.exclude(IPN__isnull=True).values_list("IPN", "pk"),
+        Part.objects.exclude(barcode_data="").values_list("barcode_data", "pk"),
+        SupplierPart.objects.values_list("SKU", "part_id"),
+    )
+    for rows in sources:
+        for key, part_id in rows.iterator():
+            key = normalize(key)
+            if key:
+                candidates[key].add(part_id)
+    return _unique(candidates)
+
+
+def location_index() -> dict:
+    """Map Shopify location ids to InvenTree stock locations via their metadata."""
+    index = {}
+    for pk, metadata in StockLocation.objects.values_list("pk", "metadata"):
+        location_id = (metadata or {}).get(LOCATION_KEY)
+        if location_id:
+            index[int(location_id)] = pk
+    return index
+
+
+def stock_index(part_ids, location_ids):
+    """Index the non-serialized in-stock items by part and location.
+
+    Returns:
+        tuple: Stock item id by (part, location) and the set of ambiguous pairs
+    """
+    candidates = defaultdict(set)
+    items = (
+        StockItem.objects.filter(StockItem.IN_STOCK_FILTER)
+        .filter(part_id__in=part_ids, location_id__in=location_ids)
+        .filter(Q(serial__isnull=True) | Q(serial=""))
+        .values_list("part_id", "location_id", "pk")
+    )
+    for part_id, location_id, pk in items.iterator():
+        candidates[(part_id, location_id)].add(pk)
+    return _unique(candidates)
+
+
+def match_variants(overwrite: bool = False) -> dict:
+    """Match variants to parts.
+
+    Args:
+        overwrite (bool): Also match variants that are already linked
+
+    Returns:
+        dict: `matched` (variant id, part id, key) tuples, `ambiguous` and `unmatched`
+        (variant id, sku, barcode) tuples
+    """
+    index, ambiguous_keys = part_index()
+    report = {"matched": [], "ambiguous": [], "unmatched": []}
+
+    variants = Variant.objects.values_list("pk", "sku", "barcode", "part_id")
+    if not overwrite:
+        variants = variants.filter(part__isnull=True)
+    for pk, sku, barcode, part_id in variants.iterator():
+        keys = [key for key in (normalize(sku), normalize(barcode)) if key]
+        matches = {index[key] for key in keys if key in index}
+        if len(matches) == 1:
+            match = matches.pop()
+            if match != part_id:
+                key = next(key for key in keys if index.get(key) == match)
+                report["matched"].append((pk, match, key))
+        elif matches or any(key in ambiguous_keys for key in keys):
+            # SKU and barcode disagree or point to several parts
+            report["ambiguous"].append((pk, sku, barcode))
+        else:
+            report["unmatched"].append((pk, sku, barcode))
+    return report
+
+
+def match_levels(variant_parts: dict, overwrite: bool = False) -> dict:
+    """Match inventory levels to stock items.
+
+    Args:
+        variant_parts (dict): Part id by variant id, including pending matches
+        overwrite (bool): Also match levels that are already linked
+
+    Returns:
+        dict: `matched` (level id, stock item id) tuples, `ambiguous` and
+        `unmatched` (level id, location id) tuples; levels of unlinked variants or
+        in unmapped locations are counted as `skipped`
+    """
+    locations = location_index()
+    report = {"matched": [], "ambiguous": [], "unmatched": [], "skipped": 0}
+
+    levels = InventoryLevel.objects.values_list(
+        "pk", "variant_id", "location_id", "stock_item_id"
+    )
+    if not overwrite:
+        levels = levels.filter(stock_item__isnull=True)
+    levels = list(levels)
+
+    index, ambiguous = stock_index(set(variant_parts.values()), set(locations.values()))
+    for pk, variant_id, location_id, stock_item_id in levels:
+        part_id = variant_parts.get(variant_id)
+        if part_id is None or location_id not in locations:
+            report["skipped"] += 1
+            continue
+        key = (part_id, locations[location_id])
+        if key in index:
+            if index[key] != stock_item_id:
+                report["matched"].append((pk, index[key]))
+        elif key in ambiguous:
+            report["ambiguous"].append((pk, location_id))
+        else:
+            report["unmatched"].append((pk, location_id))
+
+    # variants sharing a part would otherwise get the same stock item
+    used = defaultdict(list)
+    for pk, item in report["matched"]:
+        used[item].append(pk)
+    shared = {pk for pks in used.values() if len(pks) > 1 for pk in pks}
+    if shared:
+        report["ambiguous"] += [
+            (pk, location_id) for pk, _, location_id, _ in levels if pk in shared
+        ]
+        report["matched"] = [m for m in report["matched"] if m[0] not in shared]
+    return report
+
+
+def link(apply: bool = False, overwrite: bool = False) -> dict:
+    """Match variants and levels and optionally write the links.
+
+    Levels are matched with the variant links of this run, so a dry run shows
+    the complete result.
+
+    Args:
+        apply (bool): Write the matches, otherwise only report them
+        overwrite (bool): Replace existing links
+
+    Returns:
+        dict: Reports of `variants` and `levels`, see `match_variants`/`match_levels`
+    """
+    variants = match_variants(overwrite)
+    variant_parts = dict(
+        Variant.objects.filter(part__isnull=False).values_list("pk", "part_id")
+    )
+    variant_parts.update((pk, part_id) for pk, part_id, _ in variants["matched"])
+    levels = match_levels(variant_parts, overwrite)
+
+    if apply:
+        with transaction.atomic():
+            Variant.objects.bulk_update(
+                [Variant(pk=pk, part_id=part) for pk, part, _ in variants["matched"]],
+                ["part"],
+                batch_size=BATCH_SIZE,
+            )
+            InventoryLevel.objects.bulk_update(
+                [
+                    InventoryLevel(pk=pk, stock_item_id=item)
+                    for pk, item in levels["matched"]
+                ],
+                ["stock_item"],
+                batch_size=BATCH_SIZE,
+            )
+        generation.bump("products")
+        generation.bump("levels")
+    return {"variants": variants, "levels": levels}
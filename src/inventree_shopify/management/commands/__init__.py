@@ -0,0 +1 @@
+"""Commands to bootstrap, link, reconcile and benchmark the Shopify data."""
@@ -0,0 +1,210 @@
+"""Benchmarks for the Shopify integration against a local mock API."""
+
+import statistics
+import time
+from contextlib import contextmanager
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+import requests
+
+from plugin.registry import registry
+
+from ...benchmark.catalog import Catalog
+from ...benchmark.mock_shopify import MockShopify
+from ...benchmark.replay import replay
+from ...client import ShopifyClient
+
+
+def scale(value: str) -> int:
+    """Parse a size like `10000` or `10k`."""
+    value = value.lower()
+    if value.endswith("k"):
+        return int(value[:-1]) * 1000
+    return int(value)
+
+
+class Command(BaseCommand):
+    """Run a benchmark scenario against a local stand-in for the Shopify API.
+
+    The sync, webhook and push scenarios write to the configured database inside
+    a transaction that is rolled back after every run.
+    """
+
+    help = "Benchmark the Shopify integration against a local mock of the Admin API"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            "scenario", choices=["http", "full", "incremental", "webhooks", "push"]
+        )
+        parser.add_argument("--calls", type=int, default=500)
+        parser.add_argument(
+            "--size",
+            type=scale,
+            default=1000,
+            help="Number of inventory items in the store, e.g. 1k, 10k or 100k",
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=3, help="Number of timed runs"
+        )
+        parser.add_argument(
+            "--bucket",
+            type=int,
+            default=10000,
+            help="Rate limit bucket size of the mock API, 40 for a standard store",
+        )
+        parser.add_argument(
+            "--target",
+            help="Webhook endpoint url to replay the burst against instead of "
+            "applying it in this process",
+        )
+        parser.add_argument("--workers", type=int, default=8)
+
+    def handle(self, *args, **options):
+        """Run the selected scenario."""
+        getattr(self, f"bench_{options['scenario']}")(**options)
+
+    def report(self, name: str, timings: list, items: int = None):
+        """Print latency statistics for a list of timings in seconds.
+
+        With `items` (items per timing) the throughput of the median is added.
+        """
+        timings = sorted(timings)
+        median = statistics.median(timings)
+        line = (
+            f"{name:<20} calls={len(timings)} "
+            f"mean={statistics.mean(timings) * 1000:.3f}ms "
+            f"median={median * 1000:.3f}ms "
+            f"p95={timings[int(len(timings) * 0.95)] * 1000:.3f}ms"
+        )
+        if items:
+            line += f" items/s={items / median:.0f}"
+        self.stdout.write(line)
+
+    @contextmanager
+    def shop(self, catalog, bucket=None):
+        """Serve `catalog` and point the plugin to it.
+
+        Everything written to the database inside is rolled back.
+        """
+        plugin = registry.get_plugin("shopify")
+        plugin_class = type(plugin)
+        with MockShopify(catalog, bucket_size=bucket) as shop:
+            api = f"{shop.url}/admin/api"
+            with mock.patch.object(
+                plugin_class, "api_url", f"{api}/{plugin.SHOPIFY_API_VERSION}"
+            ), mock.patch.object(
+                plugin_class,
+                "graphql_url",
+                f"{api}/{plugin.SHOPIFY_GRAPHQL_API_VERSION}/graphql.json",
+            ), transaction.atomic():
+                yield plugin
+                transaction.set_rollback(True)
+
+    def timed(self, func, *args, **kwargs) -> float:
+        """Run a function and return the seconds it took."""
+        start = time.perf_counter()
+        func(*args, **kwargs)
+        return time.perf_counter() - start
+
+    def bench_http(self, calls, **kwargs):
+        """Per call latency with a new connection per call vs. the pooled client."""
+        client = ShopifyClient()
+        client.bucket.size = 10**9  # measure the transport, not the pacing
+
+        with MockShopify() as mock_shop:
+            url = f"{mock_shop.url}/admin/api/shop.json"
+            for name, call in (
+                ("new connection", lambda: requests.get(url, timeout=10)),
+                ("pooled client", lambda: client.request("GET", url)),
+            ):
+                timings = []
+                for _ in range(calls):
+                    start = time.perf_counter()
+                    call().json()
+                    timings.append(time.perf_counter() - start)
+                self.report(name, timings)
+
+    def bench_full(self, size, repeat, bucket, **kwargs):
+        """Full sync of products, variants and levels into empty tables."""
+        catalog = Catalog(size)
+        timings = []
+        for _ in range(repeat):
+            with self.shop(catalog, bucket) as plugin:
+                timings.append(self.timed(plugin.sync_all, full=True))
+        self.report(f"full sync {size}", timings, items=size)
+
+    def bench_incremental(self, size, repeat, bucket, **kwargs):
+        """Delta sync after 1% of the products changed."""
+        catalog = Catalog(size)
+        changed = max(size // 100, 1)
+        timings = []
+        for _ in range(repeat):
+            with self.shop(catalog, bucket) as plugin:
+                plugin.sync_all(full=True)
+                catalog.touch(min(changed, len(catalog.products)))
+                timings.append(self.timed(plugin.sync_all))
+        self.report(f"incremental {changed}", timings, items=changed)
+
+    def bench_webhooks(self, size, repeat, bucket, target, workers, **kwargs):
+        """A burst of `size` inventory level webhooks.
+
+        Without `--target` the burst is applied in this process, one message at a
+        time like the synchronous path and in batches like the background queue.
+        """
+        from ...models import update_inventory_levels, update_inventory_levels_bulk
+
+        catalog = Catalog(size)
+        if target:
+            secret = registry.get_plugin("shopify").get_setting("API_SHARED_SECRET")
+            for _ in range(repeat):
+                payloads = catalog.level_updates(size)
+                start = time.perf_counter()
+                timings = replay(
+                    target, secret, payloads, "inventory_levels/update", workers
+                )
+                total = time.perf_counter() - start
+                self.report(f"replay {size}", timings)
+                rate = size / total
+                self.stdout.write(f"burst {size}: {total:.3f}s, {rate:.0f} msg/s")
+            return
+
+        batch = registry.get_plugin("shopify").WEBHOOK_BATCH_SIZE
+        single, batched, runs = [], [], []
+        for _ in range(repeat):
+            with self.shop(catalog, bucket) as plugin:
+                plugin.sync_all(full=True)
+                for payload in catalog.level_updates(size):
+                    single.append(self.timed(update_inventory_levels, payload))
+                payloads = catalog.level_updates(size)
+                start = time.perf_counter()
+                for i in range(0, len(payloads), batch):
+                    chunk = payloads[i : i + batch]
+                    batched.append(self.timed(update_inventory_levels_bulk, chunk))
+                runs.append(time.perf_counter() - start)
+        self.report("single message", single, items=1)
+        self.report(f"batch of {batch}", batched, items=batch)
+        self.report(f"burst {size}", runs, items=size)
+
+    def bench_push(self, size, repeat, bucket, **kwargs):
+        """Push a changed quantity of every level to Shopify."""
+        from ...models import InventoryLevel, PendingPush
+
+        catalog = Catalog(size)
+        timings = []
+        for _ in range(repeat):
+            with self.shop(catalog, bucket) as plugin:
+                plugin.sync_all(full=True)
+                PendingPush.objects.bulk_create(
+                    PendingPush(level_id=pk, available=available + 1)
+                    for pk, available in InventoryLevel.objects.values_list(
+                        "pk", "available"
+                    )
+                )
+                if not PendingPush.objects.exists():
+                    raise CommandError("No levels were synced")
+                timings.append(self.timed(plugin.flush_pushes))
+        self.report(f"push {size}", timings, items=size)
@@ -0,0 +1,42 @@
+"""Initial import of a Shopify catalog."""
+
+from contextlib import ExitStack
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from plugin.registry import registry
+
+
+class Command(BaseCommand):
+    """Import products, variants and inventory levels with bulk operations."""
+
+    help = "Import the whole Shopify catalog with GraphQL bulk operations"  # noqa: A003
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            "--file",
+            action="append",
+            help="Import this JSONL file instead of running the bulk operations; "
+            "repeat for the products and the levels file",
+        )
+        parser.add_argument(
+            "--shop",
+            type=int,
+            help="Primary key of an additional store, the configured one if not set",
+        )
+
+    def handle(self, *args, **options):
+        """Run the import."""
+        plugin = registry.get_plugin("shopify").for_shop(options["shop"])
+        if options["file"]:
+            with ExitStack() as stack:
+                files = [
+                    stack.enter_context(open(path, encoding="utf-8"))
+                    for path in options["file"]
+                ]
+                plugin.bootstrap(chain.from_iterable(files))
+        else:
+            plugin.bootstrap()
+        self.stdout.write(self.style.SUCCESS("Shopify catalog imported"))
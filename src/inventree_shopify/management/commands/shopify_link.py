@@ -0,0 +1,54 @@
+"""Link Shopify variants and inventory levels to InvenTree parts and stock."""
+
+from django.core.management.base import BaseCommand
+
+from ...linking import link
+
+
+class Command(BaseCommand):
+    """Match variants by SKU/barcode and levels by stock location."""
+
+    help = (  # noqa: A003
+        "Link Shopify variants to parts by SKU/barcode and inventory levels to "
+        "stock items by location; only reports the matches unless --apply is set"
+    )
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            "--apply", action="store_true", help="Write the matched links"
+        )
+        parser.add_argument(
+            "--overwrite", action="store_true", help="Replace existing links"
+        )
+
+    def handle(self, *args, **options):
+        """Run the matching."""
+        report = link(apply=options["apply"], overwrite=options["overwrite"])
+        variants, levels = report["variants"], report["levels"]
+
+        if options["verbosity"] > 1:
+            for pk, part_id, key in variants["matched"]:
+                self.stdout.write(f"variant {pk} -> part {part_id} ({key})")
+            for pk, sku, barcode in variants["ambiguous"]:
+                self.stdout.write(f"variant {pk} ambiguous (SKU {sku}, {barcode})")
+            for pk, item in levels["matched"]:
+                self.stdout.write(f"level {pk} -> stock item {item}")
+            for pk, location_id in levels["ambiguous"]:
+                self.stdout.write(f"level {pk} ambiguous (location {location_id})")
+
+        self.stdout.write(
+            f"Variants: {len(variants['matched'])} matched, "
+            f"{len(variants['ambiguous'])} ambiguous, "
+            f"{len(variants['unmatched'])} unmatched"
+        )
+        self.stdout.write(
+            f"Levels: {len(levels['matched'])} matched, "
+            f"{len(levels['ambiguous'])} ambiguous, "
+            f"{len(levels['unmatched'])} unmatched, "
+            f"{levels['skipped']} without linked variant or mapped location"
+        )
+        if options["apply"]:
+            self.stdout.write(self.style.SUCCESS("Links written"))
+        else:
+            self.stdout.write("Dry run, use --apply to write the links")
@@ -0,0 +1,51 @@
+"""Detect and fix drift between Shopify inventory levels and InvenTree stock."""
+
+from django.core.management.base import BaseCommand
+
+from plugin.registry import registry
+
+
+class Command(BaseCommand):
+    """Compare every Shopify inventory level with the local state."""
+
+    help = (  # noqa: A003
+        "Compare all Shopify inventory levels with the local levels and linked "
+        "stock items; only reports the drift unless --fix is set"
+    )
+
+    def add_arguments(self, parser):
+        """Add the command arguments."""
+        parser.add_argument(
+            "--fix",
+            choices=["inventree", "shopify"],
+            help="Fix the drift in InvenTree or push the stock quantities to Shopify",
+        )
+        parser.add_argument(
+            "--sample",
+            type=int,
+            default=20,
+            help="Number of drifted levels that are listed",
+        )
+        parser.add_argument(
+            "--shop",
+            type=int,
+            help="Primary key of an additional store, the configured one if not set",
+        )
+
+    def handle(self, *args, **options):
+        """Run the comparison."""
+        plugin = registry.get_plugin("shopify").for_shop(options["shop"])
+        report = plugin.check_drift(fix=options["fix"], sample=options["sample"])
+
+        for item_id, location_id, remote, available, quantity in report["sample"]:
+            self.stdout.write(
+                f"item {item_id} @ {location_id}: shopify={remote} "
+                f"level={available} stock={quantity}"
+            )
+        self.stdout.write(
+            f"Checked {report['checked']} levels: {report['level_drift']} level "
+            f"drift, {report['stock_drift']} stock drift, {report['missing']} "
+            "missing in Shopify"
+        )
+        if options["fix"]:
+            self.stdout.write(self.style.SUCCESS(f"Fixed {report['fixed']} levels"))
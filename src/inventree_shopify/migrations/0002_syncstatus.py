@@ -0,0 +1,21 @@
+# Generated by Django 3.2.19 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncStatus',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(max_length=50, unique=True, verbose_name='Resource')),
+                ('last_sync', models.DateTimeField(blank=True, null=True, verbose_name='Last sync')),
+            ],
+        ),
+    ]
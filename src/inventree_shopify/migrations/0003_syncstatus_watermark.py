@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0002_syncstatus'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncstatus',
+            name='last_full_sync',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last full sync'),
+        ),
+        migrations.AddField(
+            model_name='syncstatus',
+            name='watermark',
+            field=models.DateTimeField(blank=True, help_text='Newest update time that was synced', null=True, verbose_name='Watermark'),
+        ),
+    ]
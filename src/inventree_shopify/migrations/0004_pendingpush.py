@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-18 11:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0003_syncstatus_watermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PendingPush',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('available', models.IntegerField(verbose_name='Available')),
+                ('queued_at', models.DateTimeField(auto_now=True, verbose_name='Queued at')),
+                ('level', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pending_push', to='inventree_shopify.inventorylevel', verbose_name='Inventory level')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.19 on 2026-10-18 13:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0019_projectcode_metadata'),
+        ('inventree_shopify', '0004_pendingpush'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedWebhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('topic', models.CharField(max_length=100, verbose_name='Topic')),
+                ('shard', models.PositiveSmallIntegerField(db_index=True, verbose_name='Shard')),
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shopify_queue', to='common.webhookmessage', verbose_name='Message')),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.19 on 2026-10-18 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0005_queuedwebhook'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedWebhook',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('webhook_id', models.CharField(max_length=100, unique=True, verbose_name='Webhook ID')),
+                ('processed_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Processed at')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0006_processedwebhook'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorylevel',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Updated at'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.19 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def set_topics(apps, schema_editor):
+    """Read the topic of existing endpoints from their name."""
+    ShopifyWebhook = apps.get_model('inventree_shopify', 'ShopifyWebhook')
+    for webhook in ShopifyWebhook.objects.filter(name__startswith='shopify_'):
+        webhook.topic = webhook.name[len('shopify_'):]
+        webhook.save(update_fields=['topic'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0007_alter_inventorylevel_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shopifywebhook',
+            name='address',
+            field=models.CharField(blank=True, max_length=250, verbose_name='Address'),
+        ),
+        migrations.AddField(
+            model_name='shopifywebhook',
+            name='topic',
+            field=models.CharField(blank=True, max_length=100, verbose_name='Topic'),
+        ),
+        migrations.RunPython(set_topics, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 17:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0008_shopifywebhook_topic_address'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='queuedwebhook',
+            name='triggered_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Triggered at'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 3.2.19 on 2026-10-18 18:10
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0009_queuedwebhook_triggered_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shop',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Name')),
+                ('url', models.CharField(help_text='URL for the shop instance, e.g. store.myshopify.com', max_length=250, unique=True, verbose_name='Shop url')),
+                ('token', models.CharField(help_text='Admin API access token of the private app', max_length=250, verbose_name='API password')),
+                ('shared_secret', models.CharField(help_text='Shared secret the webhooks of the private app are signed with', max_length=250, verbose_name='API shared secret')),
+                ('active', models.BooleanField(default=True, verbose_name='Active')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='products', to='inventree_shopify.shop', verbose_name='Shop'),
+        ),
+        migrations.AddField(
+            model_name='variant',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='variants', to='inventree_shopify.shop', verbose_name='Shop'),
+        ),
+        migrations.AddField(
+            model_name='inventorylevel',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='levels', to='inventree_shopify.shop', verbose_name='Shop'),
+        ),
+        migrations.AddField(
+            model_name='queuedwebhook',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='queued_webhooks', to='inventree_shopify.shop', verbose_name='Shop'),
+        ),
+        migrations.AddField(
+            model_name='shopifywebhook',
+            name='shop',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='webhooks', to='inventree_shopify.shop', verbose_name='Shop'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.19 on 2026-10-18 19:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0010_shop'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='variant',
+            name='shopify_variant_id',
+            field=models.BigIntegerField(blank=True, null=True, unique=True, verbose_name='Variant ID'),
+        ),
+        migrations.CreateModel(
+            name='OrderLine',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('line_id', models.BigIntegerField(unique=True, verbose_name='Line item ID')),
+                ('order_id', models.BigIntegerField(db_index=True, verbose_name='Order ID')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Applied quantity')),
+                ('updated_at', models.DateTimeField(blank=True, null=True, verbose_name='Updated at')),
+                ('shop', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='order_lines', to='inventree_shopify.shop', verbose_name='Shop')),
+                ('stock_item', models.ForeignKey(blank=True, help_text='Stock item that was taken from last, returns go back to it', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ShopifyOrderLine', to='stock.stockitem', verbose_name='StockItem')),
+                ('variant', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='order_lines', to='inventree_shopify.variant', verbose_name='Variant')),
+            ],
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.19 on 2026-10-18 19:40
+
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def move_descriptions(apps, schema_editor):
+    """Copy the product descriptions into their own table."""
+    Product = apps.get_model('inventree_shopify', 'Product')
+    ProductDescription = apps.get_model('inventree_shopify', 'ProductDescription')
+
+    rows = Product.objects.exclude(body_html='').values_list('pk', 'body_html')
+    ProductDescription.objects.bulk_create(
+        (ProductDescription(product_id=pk, body_html=body) for pk, body in rows.iterator()),
+        batch_size=500,
+    )
+
+
+def restore_descriptions(apps, schema_editor):
+    """Copy the descriptions back into the products, cut to the old length."""
+    Product = apps.get_model('inventree_shopify', 'Product')
+    ProductDescription = apps.get_model('inventree_shopify', 'ProductDescription')
+
+    for pk, body in ProductDescription.objects.values_list('pk', 'body_html').iterator():
+        Product.objects.filter(pk=pk).update(body_html=body[:250])
+
+
+def clear_invalid_prices(apps, schema_editor):
+    """Empty prices that can not be stored as a decimal, e.g. blank ones."""
+    Variant = apps.get_model('inventree_shopify', 'Variant')
+
+    for price in Variant.objects.values_list('price', flat=True).distinct():
+        try:
+            valid = Decimal(price).is_finite()
+        except (TypeError, InvalidOperation):
+            valid = False
+        if not valid:
+            Variant.objects.filter(price=price).update(price=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0011_orderline'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDescription',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='description', serialize=False, to='inventree_shopify.product', verbose_name='Product')),
+                ('body_html', models.TextField(blank=True, verbose_name='Body HTML')),
+            ],
+        ),
+        migrations.RunPython(move_descriptions, restore_descriptions),
+        migrations.AlterField(
+            model_name='variant',
+            name='price',
+            field=models.CharField(blank=True, max_length=250, null=True, verbose_name='Price'),
+        ),
+        migrations.RunPython(clear_invalid_prices, migrations.RunPython.noop),
+    ]
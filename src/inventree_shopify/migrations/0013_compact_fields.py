@@ -0,0 +1,77 @@
+# Generated by Django 3.2.19 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0012_productdescription'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='product',
+            name='body_html',
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='id',
+            field=models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Id'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='created_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Creation Date'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Update Date'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='published_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Publishing Date'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='inventory_item_id',
+            field=models.BigIntegerField(unique=True, verbose_name='Inventory item ID'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='sku',
+            field=models.CharField(db_index=True, max_length=250, verbose_name='SKU'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='barcode',
+            field=models.CharField(db_index=True, max_length=250, verbose_name='Barcode'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='price',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True, verbose_name='Price'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='created_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Creation Date'),
+        ),
+        migrations.AlterField(
+            model_name='variant',
+            name='updated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Update Date'),
+        ),
+        migrations.AlterField(
+            model_name='inventorylevel',
+            name='location_id',
+            field=models.BigIntegerField(verbose_name='Location ID'),
+        ),
+        migrations.AlterField(
+            model_name='shopifywebhook',
+            name='shopify_webhook_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+    ]
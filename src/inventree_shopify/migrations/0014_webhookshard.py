@@ -0,0 +1,20 @@
+# Generated by Django 3.2.19 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0013_compact_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WebhookShard',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(unique=True, verbose_name='Shard')),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0014_webhookshard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncstatus',
+            name='generation',
+            field=models.PositiveIntegerField(default=1, verbose_name='Generation'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.19 on 2026-10-18 22:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventree_shopify', '0015_syncstatus_generation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncstatus',
+            name='running_since',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Running since'),
+        ),
+    ]
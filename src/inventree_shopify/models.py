@@ -1,32 +1,90 @@
 """Models for ShopifyPlugin."""
-import json
-
-from django.db import models
+import datetime
+import logging
+import operator
+import threading
+import zlib
+from collections import OrderedDict, defaultdict
+from functools import reduce
+
+from django.db import connection, models, transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from stock.models import StockItem, StockItemTracking
+
 from common.models import VerificationMethod, WebhookEndpoint, WebhookMessage
 from InvenTree.status_codes import StockHistoryCode
+from InvenTree.tasks import offload_task
+from plugin.registry import call_function
 
+from . import generation, stats
 from .ShopifyPlugin import ShopifyPlugin
 
+logger = logging.getLogger("inventree")
+
+# order topics, their messages are applied in batches
+ORDER_TOPICS = ("orders/create", "orders/updated")
+
+
+class Shop(models.Model):
+    """An additional Shopify store.
+
+    The store configured in the plugin settings has no entry; data that belongs
+    to it has no shop set.
+    """
+
+    name = models.CharField(max_length=100, verbose_name=_("Name"))
+    url = models.CharField(
+        max_length=250,
+        unique=True,
+        verbose_name=_("Shop url"),
+        help_text=_("URL for the shop instance, e.g. store.myshopify.com"),
+    )
+    token = models.CharField(
+        max_length=250,
+        verbose_name=_("API password"),
+        help_text=_("Admin API access token of the private app"),
+    )
+    shared_secret = models.CharField(
+        max_length=250,
+        verbose_name=_("API shared secret"),
+        help_text=_("Shared secret the webhooks of the private app are signed with"),
+    )
+    active = models.BooleanField(default=True, verbose_name=_("Active"))
+
+    def __str__(self) -> str:
+        """Get string representation of shop."""
+        return str(self.name)
+
 
 class Product(models.Model):
     """A shopify product reference."""
 
-    id = models.IntegerField(primary_key=True, verbose_name=_("Id"))  # noqa: A003
+    id = models.BigIntegerField(primary_key=True, verbose_name=_("Id"))  # noqa: A003
     title = models.CharField(max_length=250, verbose_name=_("Title"))
-    body_html = models.CharField(max_length=250, verbose_name=_("Body HTML"))
     vendor = models.CharField(max_length=250, verbose_name=_("Vendor"))
     product_type = models.CharField(max_length=250, verbose_name=_("Product Type"))
     handle = models.CharField(max_length=250, verbose_name=_("Handle"))
-    created_at = models.DateField(
+    created_at = models.DateTimeField(
         blank=True, null=True, verbose_name=_("Creation Date")
     )
-    updated_at = models.DateField(
-        blank=True, null=True, verbose_name=_("Creation Date")
+    updated_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Update Date")
     )
-    published_at = models.DateField(
-        blank=True, null=True, verbose_name=_("Creation Date")
+    published_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Publishing Date")
+    )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="products",
+        verbose_name=_("Shop"),
     )
 
     def __str__(self):
@@ -34,22 +92,49 @@ class Product(models.Model):
         return str(self.title)
 
 
+class ProductDescription(models.Model):
+    """The HTML description of a product.
+
+    Descriptions can be large and are rarely needed, so they are kept out of the
+    product rows. Products without a description have no entry.
+    """
+
+    product = models.OneToOneField(
+        Product,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="description",
+        verbose_name=_("Product"),
+    )
+    body_html = models.TextField(blank=True, verbose_name=_("Body HTML"))
+
+    def __str__(self) -> str:
+        """Get string representation of product description."""
+        return str(self.product_id)
+
+
 class Variant(models.Model):
     """A shopify product variant reference."""
 
-    inventory_item_id = models.IntegerField(
+    inventory_item_id = models.BigIntegerField(
         verbose_name=_("Inventory item ID"), unique=True
     )
+    # id of the variant itself, order line items refer to it
+    shopify_variant_id = models.BigIntegerField(
+        blank=True, null=True, unique=True, verbose_name=_("Variant ID")
+    )
     title = models.CharField(max_length=250, verbose_name=_("Title"))
-    sku = models.CharField(max_length=250, verbose_name=_("SKU"))
-    barcode = models.CharField(max_length=250, verbose_name=_("Barcode"))
-    price = models.CharField(max_length=250, verbose_name=_("Price"))
-    created_at = models.DateField(
-        blank=True, null=True, verbose_name=_("Creation Date")
+    sku = models.CharField(max_length=250, db_index=True, verbose_name=_("SKU"))
+    barcode = models.CharField(max_length=250, db_index=True, verbose_name=_("Barcode"))
+    price = models.DecimalField(
+        max_digits=14, decimal_places=4, blank=True, null=True, verbose_name=_("Price")
     )
-    updated_at = models.DateField(
+    created_at = models.DateTimeField(
         blank=True, null=True, verbose_name=_("Creation Date")
     )
+    updated_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Update Date")
+    )
     product = models.ForeignKey(
         Product,
         on_delete=models.CASCADE,
@@ -64,6 +149,14 @@ class Variant(models.Model):
         related_name="ShopifyVariant",
         verbose_name=_("Part"),
     )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="variants",
+        verbose_name=_("Shop"),
+    )
 
     def __str__(self) -> str:
         """Get string representation of variant."""
@@ -74,9 +167,11 @@ class InventoryLevel(models.Model):
     """A shopify inventory level reference."""
 
     available = models.IntegerField(verbose_name=_("Available"))
-    location_id = models.IntegerField(verbose_name=_("Location ID"))
-    updated_at = models.DateField(
-        blank=True, null=True, verbose_name=_("Creation Date")
+    # indexed through `unique_together`, which starts with this column
+    location_id = models.BigIntegerField(verbose_name=_("Location ID"))
+    # time of the last applied change in Shopify, used to drop stale webhooks
+    updated_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Updated at")
     )
     variant = models.ForeignKey(
         Variant,
@@ -94,6 +189,14 @@ class InventoryLevel(models.Model):
         related_name="ShopifyInventoryLevel",
         verbose_name=_("StockItem"),
     )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="levels",
+        verbose_name=_("Shop"),
+    )
 
     class Meta:
         """Meta options for model."""
@@ -108,36 +211,340 @@ class InventoryLevel(models.Model):
         return str(self.variant)
 
 
+class PendingPush(models.Model):
+    """A stock level that is queued to be pushed to Shopify.
+
+    There is at most one entry per inventory level; later changes only replace the
+    quantity that will be pushed.
+    """
+
+    level = models.OneToOneField(
+        InventoryLevel,
+        on_delete=models.CASCADE,
+        related_name="pending_push",
+        verbose_name=_("Inventory level"),
+    )
+    available = models.IntegerField(verbose_name=_("Available"))
+    queued_at = models.DateTimeField(auto_now=True, verbose_name=_("Queued at"))
+
+    def __str__(self) -> str:
+        """Get string representation of pending push."""
+        return f"{self.level}: {self.available}"
+
+
+class OrderLine(models.Model):
+    """A Shopify order line item and the stock quantity applied for it.
+
+    Repeated or updated order messages only change the stock by the difference
+    between the current line quantity and the applied one.
+    """
+
+    line_id = models.BigIntegerField(unique=True, verbose_name=_("Line item ID"))
+    order_id = models.BigIntegerField(db_index=True, verbose_name=_("Order ID"))
+    quantity = models.IntegerField(default=0, verbose_name=_("Applied quantity"))
+    # `updated_at` of the order message that was applied, older ones are dropped
+    updated_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Updated at")
+    )
+    variant = models.ForeignKey(
+        Variant,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="order_lines",
+        verbose_name=_("Variant"),
+    )
+    stock_item = models.ForeignKey(
+        "stock.StockItem",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="ShopifyOrderLine",
+        verbose_name=_("StockItem"),
+        help_text=_("Stock item that was taken from last, returns go back to it"),
+    )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="order_lines",
+        verbose_name=_("Shop"),
+    )
+
+    def __str__(self) -> str:
+        """Get string representation of order line."""
+        return f"{self.order_id}/{self.line_id}: {self.quantity}"
+
+
+class SyncStatus(models.Model):
+    """State of the background sync for one resource."""
+
+    resource = models.CharField(max_length=50, unique=True, verbose_name=_("Resource"))
+    last_sync = models.DateTimeField(blank=True, null=True, verbose_name=_("Last sync"))
+    last_full_sync = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Last full sync")
+    )
+    watermark = models.DateTimeField(
+        blank=True,
+        null=True,
+        verbose_name=_("Watermark"),
+        help_text=_("Newest update time that was synced"),
+    )
+    # changes with the synced data, see `generation`
+    generation = models.PositiveIntegerField(default=1, verbose_name=_("Generation"))
+    running_since = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Running since")
+    )
+
+    def __str__(self) -> str:
+        """Get string representation of sync status."""
+        return str(self.resource)
+
+    @classmethod
+    def last(cls, resource: str):
+        """Get the time of the last finished sync for a resource."""
+        return (
+            cls.objects.filter(resource=resource)
+            .values_list("last_sync", flat=True)
+            .first()
+        )
+
+    @classmethod
+    def get(cls, resource: str):
+        """Get the sync status for a resource, create it if needed."""
+        return cls.objects.get_or_create(resource=resource)[0]
+
+    @classmethod
+    def claim(cls, resource: str, timeout) -> bool:
+        """Mark a sync as running unless another one is.
+
+        The check and the mark are made under the row lock of the status, so only
+        one process starts the sync. A mark older than `timeout` (timedelta) is
+        left by a crashed sync and is taken over.
+
+        Returns:
+            bool: True if the caller may run the sync, see `release`
+        """
+        cls.get(resource)
+        now = timezone.now()
+        with transaction.atomic():
+            status = cls.objects.select_for_update().get(resource=resource)
+            if status.running_since and status.running_since + timeout > now:
+                return False
+            status.running_since = now
+            status.save(update_fields=["running_since"])
+        return True
+
+    @classmethod
+    def release(cls, resource: str):
+        """Mark the sync claimed with `claim` as finished."""
+        cls.objects.filter(resource=resource).update(running_since=None)
+
+    def delta_start(self, full_interval):
+        """Get the start time for a delta sync.
+
+        Args:
+            full_interval (timedelta): Maximum time between full syncs
+
+        Returns:
+            datetime: Watermark to sync from or None if a full sync is due
+        """
+        if not self.watermark or not self.last_full_sync:
+            return None
+        if self.last_full_sync + full_interval <= timezone.now():
+            return None
+        return self.watermark
+
+    def finish(self, watermark=None, full=False, started=None):
+        """Record that a sync for this resource finished just now.
+
+        Args:
+            watermark (datetime): Newest update time seen during the sync
+            full (bool): The sync covered all items
+            started (datetime): Start of the sync; items changed after it can be
+                missing from pages fetched earlier, so the watermark stays before it
+        """
+        if watermark and started:
+            watermark = min(watermark, started)
+        self.last_sync = timezone.now()
+        if full:
+            self.last_full_sync = self.last_sync
+        if watermark and (not self.watermark or watermark > self.watermark):
+            self.watermark = watermark
+        # the generation is bumped concurrently
+        self.save(update_fields=["last_sync", "last_full_sync", "watermark"])
+
+
+class QueuedWebhook(models.Model):
+    """A received webhook message waiting for the background worker.
+
+    Messages are spread over shards by the item they change; every shard is
+    processed by one worker at a time in the order the messages arrived.
+    """
+
+    message = models.OneToOneField(
+        WebhookMessage,
+        on_delete=models.CASCADE,
+        related_name="shopify_queue",
+        verbose_name=_("Message"),
+    )
+    topic = models.CharField(max_length=100, verbose_name=_("Topic"))
+    shard = models.PositiveSmallIntegerField(db_index=True, verbose_name=_("Shard"))
+    # time Shopify sent the message, used to measure the webhook lag
+    triggered_at = models.DateTimeField(
+        blank=True, null=True, verbose_name=_("Triggered at")
+    )
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="queued_webhooks",
+        verbose_name=_("Shop"),
+    )
+
+    def __str__(self) -> str:
+        """Get string representation of queued webhook."""
+        return f"{self.topic} ({self.shard})"
+
+    @staticmethod
+    def ordering_key(topic: str, payload: dict) -> str:
+        """Key of the item a message changes, its messages are kept in order."""
+        if topic.startswith("inventory_levels/"):
+            return f"{payload.get('inventory_item_id')}:{payload.get('location_id')}"
+        return f"{topic.split('/')[0]}:{payload.get('id')}"
+
+    @classmethod
+    def enqueue(cls, message, topic: str, payload: dict, triggered_at=None, shop=None):
+        """Queue a message and make sure a worker picks up its shard."""
+        shards = max(int(ShopifyPlugin().get_setting("WEBHOOK_WORKERS")), 1)
+        key = cls.ordering_key(topic, payload)
+        shard = zlib.crc32(key.encode()) % shards
+        cls.objects.create(
+            message=message,
+            topic=topic,
+            shard=shard,
+            triggered_at=triggered_at,
+            shop=shop,
+        )
+        offload_task(
+            call_function, ShopifyPlugin.SLUG, "process_webhook_queue", shard=shard
+        )
+
+
+class WebhookShard(models.Model):
+    """Lock row of a webhook queue shard.
+
+    The worker that drains a shard holds the row lock of its entry, the database
+    keeps other workers out in every process.
+    """
+
+    shard = models.PositiveSmallIntegerField(unique=True, verbose_name=_("Shard"))
+
+    def __str__(self) -> str:
+        """Get string representation of webhook shard."""
+        return str(self.shard)
+
+
+class ProcessedWebhook(models.Model):
+    """Id of a handled webhook message, used to drop deliveries Shopify repeats."""
+
+    webhook_id = models.CharField(
+        max_length=100, unique=True, verbose_name=_("Webhook ID")
+    )
+    processed_at = models.DateTimeField(
+        auto_now_add=True, db_index=True, verbose_name=_("Processed at")
+    )
+
+    def __str__(self) -> str:
+        """Get string representation of processed webhook."""
+        return str(self.webhook_id)
+
+    @classmethod
+    def prune(cls, days: int):
+        """Remove entries older than `days`, Shopify stops retrying after 48 hours."""
+        cls.objects.filter(
+            processed_at__lt=timezone.now() - datetime.timedelta(days=days)
+        ).delete()
+
+
+class RecentIds:
+    """Bounded in-process set of ids, the least recently used ones are dropped."""
+
+    def __init__(self, size: int):
+        """Create an empty set holding at most `size` ids."""
+        self.size = size
+        self.ids = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key) -> bool:
+        """Check for an id and mark it as recently used."""
+        with self.lock:
+            if key in self.ids:
+                self.ids.move_to_end(key)
+                return True
+            return False
+
+    def add(self, key):
+        """Add an id, dropping the oldest one if the set is full."""
+        with self.lock:
+            self.ids[key] = True
+            self.ids.move_to_end(key)
+            if len(self.ids) > self.size:
+                self.ids.popitem(last=False)
+
+
 class ShopifyWebhook(WebhookEndpoint):
     """Reference for Shopify specific webhook."""
 
     TOKEN_NAME = "X-Shopify-Hmac-Sha256"  # noqa: S105
     VERIFICATION_METHOD = VerificationMethod.HMAC
 
-    shopify_webhook_id = models.IntegerField(blank=True, null=True)
+    shopify_webhook_id = models.BigIntegerField(blank=True, null=True)
+    topic = models.CharField(max_length=100, blank=True, verbose_name=_("Topic"))
+    address = models.CharField(max_length=250, blank=True, verbose_name=_("Address"))
+    shop = models.ForeignKey(
+        Shop,
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+        related_name="webhooks",
+        verbose_name=_("Shop"),
+    )
+
+    # ids handled by this process, saves the lookup for quickly repeated deliveries
+    recent_ids = RecentIds(size=10000)
 
     def init(self, request, *args, **kwargs):
         """Setup for webhook handler."""
         super().init(request, *args, **kwargs)
-        self.secret = ShopifyPlugin().get_setting("API_SHARED_SECRET")
+        if self.shop:
+            self.secret = self.shop.shared_secret
+        else:
+            self.secret = ShopifyPlugin().get_setting("API_SHARED_SECRET")
 
     def process_payload(self, message, payload=None, headers=None):
-        """Process a webhook message."""
+        """Process a webhook message.
+
+        With WEBHOOK_ASYNC the message is only queued here and processed by the
+        background worker, so Shopify gets its answer right away.
+        """
+        from .sync import parse_date
+
         topic = headers["X-Shopify-Topic"]
         if self.check_if_handled(headers):
             return False
 
-        if topic == "inventory_levels/update":
-            # handle invetorylevel update
-            update_inventory_levels(payload)
-        # elif topic == 'orders/edited':
-        #     # handle order edited
-        #     pass
-
-        # elif topic == 'orders/updated':
-        #     # handle order update
-        #     pass
-
+        plugin = ShopifyPlugin()
+        triggered_at = parse_date(headers.get("X-Shopify-Triggered-At"))
+        if plugin.get_setting("WEBHOOK_ASYNC"):
+            QueuedWebhook.enqueue(message, topic, payload, triggered_at, self.shop)
+        else:
+            with plugin.measure("webhook"):
+                process_webhook(topic, payload, self.shop)
+            record_lag(triggered_at)
+        self.mark_handled(headers)
         return True
 
     def check_if_handled(self, headers: dict) -> bool:
@@ -150,55 +557,274 @@ class ShopifyWebhook(WebhookEndpoint):
             bool: True if message handled
         """
         message_id = headers["X-Shopify-Webhook-Id"]
-        msgs = WebhookMessage.objects.filter(
-            endpoint=self, header__contains=message_id, worked_on=True
-        )
-        if msgs.exists():
-            # this was already worked on - we think
-            msg = msgs.first()
-            payload = json.loads(msg.header)
-            if payload.get("X-Shopify-Webhook-Id", "") == message_id:
-                # now we can be sure
-                return True
+        if message_id in self.recent_ids:
+            return True
+        if ProcessedWebhook.objects.filter(webhook_id=message_id).exists():
+            self.recent_ids.add(message_id)
+            return True
         return False
 
+    def mark_handled(self, headers: dict):
+        """Remember that a webhook message was handled.
+
+        Args:
+            headers (dict): Headers of message
+        """
+        message_id = headers["X-Shopify-Webhook-Id"]
+        ProcessedWebhook.objects.get_or_create(webhook_id=message_id)
+        self.recent_ids.add(message_id)
+
     def get_return(self, payload, headers=None, request=None):
         """Shopify expects no returns."""
         return None
 
 
-def update_inventory_levels(payload: dict):
+def process_webhook(topic: str, payload: dict, shop=None):
+    """Apply the payload of a webhook message.
+
+    :param topic: topic of the webhook
+    :type topic: str
+    :param payload: payload of webhook
+    :type payload: dict
+    :param shop: store that sent the message, None for the default store
+    :type shop: Shop
+    """
+    handler = WEBHOOK_HANDLERS.get(topic)
+    if handler:
+        handler(payload, shop=shop)
+
+
+def _process_queued(item):
+    try:
+        # a failed message must not break the transaction of its batch
+        with transaction.atomic():
+            process_webhook(item.topic, item.message.body, item.shop)
+    except Exception:
+        # do not block the queue, the message stays stored
+        logger.exception("Processing Shopify webhook %s failed", item.message_id)
+
+
+def process_webhook_batch(items: list):
+    """Apply a batch of queued webhook messages.
+
+    Inventory level updates and orders of the same store are applied together,
+    other messages one by one.
+
+    :param items: queued messages in order of arrival
+    :type items: list[QueuedWebhook]
+    """
+    from .orders import apply_orders
+
+    levels, orders = [], defaultdict(list)
+    for item in items:
+        if item.topic == "inventory_levels/update":
+            levels.append(item)
+        elif item.topic in ORDER_TOPICS:
+            orders[item.shop].append(item)
+        else:
+            _process_queued(item)
+
+    if levels:
+        try:
+            update_inventory_levels_bulk([item.message.body for item in levels])
+        except Exception:
+            logger.exception("Batched inventory level update failed, retry one by one")
+            for item in levels:
+                _process_queued(item)
+
+    for shop, queued in orders.items():
+        try:
+            apply_orders([item.message.body for item in queued], shop=shop)
+        except Exception:
+            logger.exception("Batched order update failed, retry one by one")
+            for item in queued:
+                _process_queued(item)
+
+    for item in items:
+        record_lag(item.triggered_at)
+
+
+def record_lag(triggered_at):
+    """Record the time from a change in Shopify until it was applied."""
+    if triggered_at:
+        lag = (timezone.now() - triggered_at).total_seconds()
+        stats.observe("webhook_lag", max(lag, 0))
+
+
+def update_inventory_levels_bulk(payloads: list):
+    """Apply many inventory level updates in one transaction.
+
+    Only the newest payload per level is applied. Levels, stock items and
+    tracking entries are written with bulk queries; this skips `StockItem.save`,
+    so no events are sent for these changes.
+
+    :param payloads: payloads of webhooks in order of arrival
+    :type payloads: list[dict]
+    """
+    from .sync import parse_date
+
+    # reduce to the newest payload per level, later arrivals win ties
+    latest = {}
+    for payload in payloads:
+        key = (payload["inventory_item_id"], payload["location_id"])
+        updated_at = parse_date(payload.get("updated_at"))
+        current = latest.get(key)
+        if current and updated_at and current[0] and updated_at < current[0]:
+            continue
+        latest[key] = (updated_at, payload["available"])
+    if not latest:
+        return
+
+    with transaction.atomic():
+        levels = InventoryLevel.objects.filter(
+            reduce(
+                operator.or_,
+                (
+                    Q(variant__inventory_item_id=item_id, location_id=location_id)
+                    for item_id, location_id in latest
+                ),
+            )
+        )
+        # only the level rows are locked, PostgreSQL can not lock the nullable
+        # side of the outer join to the stock items
+        if connection.features.has_select_for_update_of:
+            levels = levels.select_for_update(of=("self",))
+        else:
+            # e.g. MariaDB, lock the levels without the join first
+            locked = list(levels.select_for_update().values_list("pk", flat=True))
+            levels = InventoryLevel.objects.filter(pk__in=locked)
+        levels = levels.select_related("variant", "stock_item")
+
+        changed_levels, changed_items, entries = [], [], []
+        for level in levels:
+            key = (level.variant.inventory_item_id, level.location_id)
+            if key not in latest:
+                continue
+            updated_at, avail = latest[key]
+            # drop stale payloads
+            if updated_at and level.updated_at and level.updated_at >= updated_at:
+                continue
+
+            level.available = avail
+            if updated_at:
+                level.updated_at = updated_at
+            changed_levels.append(level)
+
+            item = level.stock_item
+            if item and item.quantity != avail and not item.is_building:
+                item.quantity = avail
+                changed_items.append(item)
+                entries.append(
+                    StockItemTracking(
+                        item=item,
+                        tracking_type=StockHistoryCode.STOCK_COUNT.value,
+                        notes="changed in shopify inventory",
+                        deltas={"quantity": float(avail)},
+                    )
+                )
+
+        InventoryLevel.objects.bulk_update(changed_levels, ["available", "updated_at"])
+        StockItem.objects.bulk_update(changed_items, ["quantity"])
+        StockItemTracking.objects.bulk_create(entries)
+    if changed_levels:
+        generation.bump("levels")
+
+
+def update_product(payload: dict, shop=None):
+    """Handle created or updated products, the payload includes the variants."""
+    from .sync import upsert_products
+
+    upsert_products([payload], shop=shop)
+
+
+def delete_product(payload: dict, shop=None):
+    """Handle deleted products, variants and levels are removed with them."""
+    Product.objects.filter(pk=payload["id"]).delete()
+
+
+def update_order(payload: dict, shop=None):
+    """Handle created or updated orders, see `orders.apply_orders`."""
+    from .orders import apply_orders
+
+    apply_orders([payload], shop=shop)
+
+
+def update_inventory_levels(payload: dict, shop=None):
     """Handle updates to inventory levels.
 
+    Payloads that are older than the last change applied to the level are
+    dropped, so delayed retries can not overwrite newer quantities.
+
     :param payload: payload of webhook
     :type payload: dict
+    :param shop: store that sent the message; not needed, Shopify ids are unique
+        across stores
     """
+    from .sync import parse_date
+
     # fetch item
-    item = InventoryLevel.objects.filter(
-        variant__inventory_item_id=payload["inventory_item_id"],
-        location_id=payload["location_id"],
-    )
-    if item.exists() and item.count() == 1:
-        item = item.first()
-        avail = payload["available"]
-
-        # set item qty
-        item.available = avail
-        if item.stock_item:
-            # check if the quantity changed and skip if not
-            if item.stock_item.quantity == avail:
-                return
-
-            # set stock item qty
-            item.stock_item.quantity = avail
-            item.stock_item.save()
-            # add tracking entry
-            item.stock_item.add_tracking_entry(
-                StockHistoryCode.STOCK_COUNT,
-                None,
-                notes="changed in shopify inventory",
-                deltas={
-                    "quantity": float(avail),
-                },
-            )
-        item.save()
+    item = (
+        InventoryLevel.objects.select_related("stock_item")
+        .filter(
+            variant__inventory_item_id=payload["inventory_item_id"],
+            location_id=payload["location_id"],
+        )
+        .first()
+    )
+    if item is None:
+        return
+    avail = payload["available"]
+    updated_at = parse_date(payload.get("updated_at"))
+
+    # set item qty if this is the newest change
+    level = InventoryLevel.objects.filter(pk=item.pk)
+    if updated_at:
+        level = level.filter(Q(updated_at__isnull=True) | Q(updated_at__lt=updated_at))
+        changed = level.update(available=avail, updated_at=updated_at)
+    else:
+        changed = level.update(available=avail)
+    if not changed:
+        return
+    generation.bump("levels")
+
+    if item.stock_item:
+        # check if the quantity changed and skip if not
+        if item.stock_item.quantity == avail:
+            return
+
+        # set stock item qty
+        item.stock_item.quantity = avail
+        item.stock_item.save()
+        # add tracking entry
+        item.stock_item.add_tracking_entry(
+            StockHistoryCode.STOCK_COUNT,
+            None,
+            notes="changed in shopify inventory",
+            deltas={
+                "quantity": float(avail),
+            },
+        )
+
+
+# topics that are subscribed in Shopify and their handlers
+WEBHOOK_HANDLERS = {
+    "inventory_levels/update": update_inventory_levels,
+    "products/create": update_product,
+    "products/update": update_product,
+    "products/delete": delete_product,
+    "orders/create": update_order,
+    "orders/updated": update_order,
+}
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=Variant)
+def product_changed(sender, **kwargs):
+    """Invalidate the cached product overview after single saves, e.g. linking."""
+    generation.bump("products")
+
+
+@receiver([post_save, post_delete], sender=InventoryLevel)
+def level_changed(sender, **kwargs):
+    """Invalidate the cached level overview after single saves, e.g. linking."""
+    generation.bump("levels")
@@ -0,0 +1,231 @@
+"""Stock removals for Shopify orders.
+
+Line items are mapped to the part of their variant and the sold quantity is taken
+from the in-stock items of that part. Variants whose inventory levels are linked to
+stock items are skipped: Shopify adjusts those levels for the order itself and the
+level webhook already changes the linked stock item, so the order would be counted
+twice.
+"""
+
+import logging
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q
+
+from stock.models import StockItem, StockItemTracking
+
+from InvenTree.status_codes import StockHistoryCode
+
+from .linking import location_index
+from .models import OrderLine, Variant
+from .sync import BATCH_SIZE, parse_date
+
+logger = logging.getLogger("inventree")
+
+ORDER_LINE_FIELDS = ["quantity", "updated_at", "stock_item"]
+
+
+def latest_orders(payloads: list) -> list:
+    """Reduce order payloads to the newest one per order, later arrivals win ties.
+
+    Returns:
+        list: (updated_at, payload) tuples
+    """
+    latest = {}
+    for payload in payloads:
+        updated_at = parse_date(payload.get("updated_at"))
+        current = latest.get(payload["id"])
+        if current and updated_at and current[0] and updated_at < current[0]:
+            continue
+        latest[payload["id"]] = (updated_at, payload)
+    return list(latest.values())
+
+
+def line_quantity(order: dict, line: dict) -> int:
+    """Quantity of a line item that is still sold, 0 for cancelled orders.
+
+    `current_quantity` excludes items removed by order edits and refunds.
+    """
+    if order.get("cancelled_at"):
+        return 0
+    quantity = line.get("current_quantity")
+    if quantity is None:
+        quantity = line.get("quantity") or 0
+    return max(int(quantity), 0)
+
+
+def prefer_location(items: list, location_id) -> list:
+    """Order stock items so those in `location_id` come first."""
+    if not location_id:
+        return items
+    return sorted(items, key=lambda item: item.location_id != location_id)
+
+
+class StockChanges:
+    """Collects quantity changes of stock items and their tracking entries."""
+
+    def __init__(self, items: dict):
+        """Work on `items`, locked stock items by primary key."""
+        self.items = items
+        self.changed = set()
+        self.entries = []
+
+    def remove(self, candidates: list, quantity: int, notes: str):
+        """Take up to `quantity` from the candidates in their order.
+
+        Returns:
+            tuple: Removed quantity and the item that was taken from last
+        """
+        removed, last = 0, None
+        for item in candidates:
+            if removed >= quantity:
+                break
+            take = min(int(item.quantity), quantity - removed)
+            if take <= 0:
+                continue
+            self._change(item, -take, StockHistoryCode.STOCK_REMOVE, notes)
+            removed += take
+            last = item
+        return removed, last
+
+    def add(self, item, quantity: int, notes: str):
+        """Put `quantity` back into a stock item."""
+        self._change(item, quantity, StockHistoryCode.STOCK_ADD, notes)
+
+    def _change(self, item, delta: int, code, notes: str):
+        item.quantity += delta
+        self.changed.add(item.pk)
+        key = "removed" if delta < 0 else "added"
+        self.entries.append(
+            StockItemTracking(
+                item=item,
+                tracking_type=code.value,
+                notes=notes,
+                deltas={key: float(abs(delta)), "quantity": float(item.quantity)},
+            )
+        )
+
+    def save(self):
+        """Write the changed items and tracking entries with bulk queries.
+
+        This skips `StockItem.save`, so no events are sent for these changes.
+        """
+        changed = [self.items[pk] for pk in self.changed]
+        StockItem.objects.bulk_update(changed, ["quantity"], batch_size=BATCH_SIZE)
+        StockItemTracking.objects.bulk_create(self.entries, batch_size=BATCH_SIZE)
+
+
+@transaction.atomic
+def apply_orders(payloads: list, shop=None):
+    """Apply the line items of order messages to the stock of linked parts.
+
+    Every line item records the quantity applied for it, so repeated or updated
+    messages only change the stock by the difference and cancelled orders put it
+    back. Stock is taken from the non-serialized in-stock items of the part, those
+    in the stock location mapped to the order location first. The whole batch is
+    read and written with a fixed number of queries.
+
+    Args:
+        payloads (list): Order payloads in order of arrival
+        shop (Shop): Store that sent the orders, None for the default store
+    """
+    lines = {
+        line["id"]: (updated_at, order, line)
+        for updated_at, order in latest_orders(payloads)
+        for line in order.get("line_items") or []
+        if line.get("variant_id")
+    }
+    if not lines:
+        return
+
+    # levels linked to stock items already follow Shopify's own adjustment
+    variants = {
+        shopify_id: (pk, part_id)
+        for shopify_id, pk, part_id in Variant.objects.filter(
+            shopify_variant_id__in={line["variant_id"] for *_, line in lines.values()},
+            part__isnull=False,
+        )
+        .exclude(levels__stock_item__isnull=False)
+        .values_list("shopify_variant_id", "pk", "part_id")
+    }
+    applied = OrderLine.objects.select_for_update().in_bulk(
+        list(lines), field_name="line_id"
+    )
+
+    changes = []
+    for line_id, (updated_at, order, line) in lines.items():
+        variant = variants.get(line["variant_id"])
+        record = applied.get(line_id)
+        if record is None:
+            if variant is None:
+                continue
+            record = OrderLine(
+                line_id=line_id, order_id=order["id"], variant_id=variant[0], shop=shop
+            )
+        elif updated_at and record.updated_at and record.updated_at >= updated_at:
+            # stale message
+            continue
+        record.updated_at = updated_at
+        part_id = variant[1] if variant else None
+        changes.append((record, part_id, line_quantity(order, line), order))
+    if not changes:
+        return
+
+    # lock the stock of all parts in the batch at once
+    parts = {part_id for _, part_id, *_ in changes if part_id}
+    candidates = defaultdict(list)
+    items = {}
+    for item in (
+        StockItem.objects.select_for_update()
+        .filter(StockItem.IN_STOCK_FILTER, part_id__in=parts)
+        .filter(Q(serial__isnull=True) | Q(serial=""))
+        .order_by("pk")
+    ):
+        candidates[item.part_id].append(item)
+        items[item.pk] = item
+    returns = {
+        record.stock_item_id
+        for record, _, target, _ in changes
+        if target < record.quantity and record.stock_item_id not in items
+    }
+    returns.discard(None)
+    items.update(StockItem.objects.select_for_update().in_bulk(returns))
+
+    locations = {}
+    if any(order.get("location_id") for *_, order in changes):
+        locations = location_index()
+    stock = StockChanges(items)
+    for record, part_id, target, order in changes:
+        delta = target - record.quantity
+        notes = f"Shopify order {order.get('name') or order['id']}"
+        if delta > 0 and part_id:
+            preferred = locations.get(order.get("location_id"))
+            ordered = prefer_location(candidates[part_id], preferred)
+            removed, last = stock.remove(ordered, delta, notes)
+            if removed < delta:
+                logger.warning(
+                    "Not enough stock of part %s for %s, %s missing",
+                    part_id,
+                    notes,
+                    delta - removed,
+                )
+            record.quantity += removed
+            if last:
+                record.stock_item = last
+        elif delta < 0:
+            item = items.get(record.stock_item_id) or next(
+                iter(candidates.get(part_id) or []), None
+            )
+            if item is None:
+                logger.warning("No stock item to return %s of %s to", -delta, notes)
+                continue
+            stock.add(item, -delta, notes)
+            record.quantity = target
+            record.stock_item = item
+
+    stock.save()
+    new = [record for record, *_ in changes if record.pk is None]
+    existing = [record for record, *_ in changes if record.pk is not None]
+    OrderLine.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    OrderLine.objects.bulk_update(existing, ORDER_LINE_FIELDS, batch_size=BATCH_SIZE)
@@ -0,0 +1,241 @@
+"""Counters and latency histograms for the Shopify integration.
+
+The values are kept in the default cache. Syncs, pushes and queued webhooks run in
+the background workers, so the cache must be shared by all processes (e.g. Redis)
+for the web process to report their numbers; a per-process cache like
+`LocMemCache` only shows what the web process did itself. `check_shared_cache`
+warns about such a cache.
+
+Work done inside a `phase` is timed, and the API requests (and optionally database
+queries) it causes are counted per phase.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.checks import Warning, register
+from django.db import connection
+
+PREFIX = "shopify:stats:"
+
+COUNTERS = (
+    "api_requests",
+    "api_throttled",
+    "api_retried",
+    "echo_suppressed",
+)
+
+# instrumented code paths
+PHASES = (
+    "fetch_products",
+    "fetch_levels",
+    "process_event",
+    "push",
+    "webhook",
+)
+# counters that are also kept per phase
+PHASE_COUNTERS = ("api_requests", "api_throttled", "api_retried", "queries")
+HISTOGRAMS = PHASES + ("api", "webhook_lag")
+
+# upper bounds of the histogram buckets in seconds, the last bucket is unbounded
+BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900)
+
+_local = threading.local()
+_lock = threading.Lock()
+
+# cache backends that keep separate values in every process
+LOCAL_CACHES = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def is_shared() -> bool:
+    """Check if the default cache is shared by the web and worker processes."""
+    return settings.CACHES.get("default", {}).get("BACKEND") not in LOCAL_CACHES
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Warn if the stats can not be collected from the background workers."""
+    if is_shared():
+        return []
+    return [
+        Warning(
+            "The default cache is not shared between processes, Shopify stats only "
+            "show the work of the web process",
+            hint="Configure a cache server for InvenTree (INVENTREE_CACHE_HOST)",
+            id="inventree_shopify.W001",
+        )
+    ]
+
+
+def _add(key: str, amount: int):
+    key = PREFIX + key
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # counter does not exist yet
+        if not cache.add(key, amount, timeout=None):
+            cache.incr(key, amount)
+
+
+def _tallies() -> list:
+    if not hasattr(_local, "tallies"):
+        _local.tallies = []
+    return _local.tallies
+
+
+def _record(name: str, amount: int = 1):
+    """Count into the phases running in this thread."""
+    tallies = _tallies()
+    if tallies:
+        with _lock:
+            for tally in tallies:
+                tally[name] += amount
+
+
+def incr(name: str, amount: int = 1):
+    """Increase a counter."""
+    _add(name, amount)
+    _record(name, amount)
+
+
+def counters(names=COUNTERS) -> dict:
+    """Get the current value of counters."""
+    values = cache.get_many([PREFIX + name for name in names])
+    return {name: values.get(PREFIX + name, 0) for name in names}
+
+
+def reset(names=COUNTERS):
+    """Reset counters to zero."""
+    cache.delete_many([PREFIX + name for name in names])
+
+
+def observe(name: str, seconds: float):
+    """Record a duration in a histogram."""
+    _add(f"{name}:bucket:{bisect_left(BUCKETS, seconds)}", 1)
+    _add(f"{name}:count", 1)
+    _add(f"{name}:sum_ms", int(seconds * 1000))
+
+
+def histogram(name: str) -> dict:
+    """Get a histogram.
+
+    Returns:
+        dict: Cumulative `buckets` as (upper bound, count) tuples, the `count` and
+        `sum` of all recorded durations
+    """
+    keys = [f"{name}:bucket:{i}" for i in range(len(BUCKETS) + 1)]
+    values = counters(keys + [f"{name}:count", f"{name}:sum_ms"])
+    total, buckets = 0, []
+    for key, bound in zip(keys, BUCKETS + (float("inf"),)):
+        total += values[key]
+        buckets.append((bound, total))
+    return {
+        "buckets": buckets,
+        "count": values[f"{name}:count"],
+        "sum": values[f"{name}:sum_ms"] / 1000,
+    }
+
+
+def quantile(hist: dict, q: float):
+    """Estimate a quantile of a histogram as the upper bound of its bucket."""
+    if not hist["count"]:
+        return None
+    for bound, count in hist["buckets"]:
+        if count >= q * hist["count"]:
+            return bound
+    return None
+
+
+def _count_query(execute, sql, params, many, context):
+    _record("queries")
+    return execute(sql, params, many, context)
+
+
+@contextmanager
+def phase(name: str, queries: bool = False):
+    """Time a code path and count the API requests it causes.
+
+    Args:
+        name (str): Name of the phase, see `PHASES`
+        queries (bool): Also count the database queries of this thread
+    """
+    tally = Counter()
+    tallies = _tallies()
+    tallies.append(tally)
+    start = time.perf_counter()
+    try:
+        if queries:
+            with connection.execute_wrapper(_count_query):
+                yield
+        else:
+            yield
+    finally:
+        observe(name, time.perf_counter() - start)
+        # phases of a thread are nested
+        tallies.pop()
+        for counter, amount in tally.items():
+            _add(f"{name}:{counter}", amount)
+
+
+def bind(func):
+    """Count what `func` does in worker threads into the phases of this thread."""
+    tallies = list(_tallies())
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        previous = _tallies()
+        _local.tallies = tallies
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _local.tallies = previous
+
+    return wrapper
+
+
+def phase_counters(name: str) -> dict:
+    """Get the counters of a phase."""
+    values = counters([f"{name}:{counter}" for counter in PHASE_COUNTERS])
+    return {counter: values[f"{name}:{counter}"] for counter in PHASE_COUNTERS}
+
+
+def export() -> str:
+    """Render all values in the Prometheus text format."""
+    lines = []
+    for name, value in counters().items():
+        lines.append(f"# TYPE shopify_{name}_total counter")
+        lines.append(f"shopify_{name}_total {value}")
+
+    def add_histogram(metric, hist, labels=""):
+        for bound, count in hist["buckets"]:
+            le = "+Inf" if bound == float("inf") else bound
+            sep = "," if labels else ""
+            lines.append(f'{metric}_bucket{{{labels}{sep}le="{le}"}} {count}')
+        labels = f"{{{labels}}}" if labels else ""
+        lines.append(f"{metric}_sum{labels} {hist['sum']}")
+        lines.append(f"{metric}_count{labels} {hist['count']}")
+
+    lines.append("# TYPE shopify_phase_seconds histogram")
+    for name in PHASES:
+        add_histogram("shopify_phase_seconds", histogram(name), f'phase="{name}"')
+    values = {name: phase_counters(name) for name in PHASES}
+    for counter in PHASE_COUNTERS:
+        lines.append(f"# TYPE shopify_phase_{counter}_total counter")
+        for name in PHASES:
+            value = values[name][counter]
+            lines.append(f'shopify_phase_{counter}_total{{phase="{name}"}} {value}')
+
+    lines.append("# TYPE shopify_api_request_seconds histogram")
+    add_histogram("shopify_api_request_seconds", histogram("api"))
+    lines.append("# TYPE shopify_webhook_lag_seconds histogram")
+    add_histogram("shopify_webhook_lag_seconds", histogram("webhook_lag"))
+    return "\n".join(lines) + "\n"
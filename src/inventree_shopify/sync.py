@@ -0,0 +1,316 @@
+"""Bulk write helpers for storing Shopify data in the local tables."""
+
+import datetime
+import json
+
+from django.db import transaction
+
+from . import generation
+from .models import InventoryLevel, Product, ProductDescription, Variant
+
+BATCH_SIZE = 500
+
+PRODUCT_FIELDS = [
+    "title",
+    "vendor",
+    "product_type",
+    "handle",
+    "created_at",
+    "updated_at",
+    "published_at",
+    "shop",
+]
+VARIANT_FIELDS = [
+    "title",
+    "sku",
+    "barcode",
+    "price",
+    "created_at",
+    "updated_at",
+    "product_id",
+    "shopify_variant_id",
+    "shop",
+]
+LEVEL_FIELDS = ["available", "updated_at", "shop"]
+
+
+def parse_date(value):
+    """Parse an ISO timestamp as sent by Shopify, empty values stay None."""
+    if not value:
+        return None
+    # the GraphQL API uses `Z`, which fromisoformat only accepts from Python 3.11
+    return datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def format_timestamp(value: datetime.datetime) -> str:
+    """Format a timestamp for use in url arguments.
+
+    The time is converted to UTC without an offset, a `+` would need escaping.
+    """
+    return value.astimezone(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def latest_update(items: list, current=None):
+    """Get the newest `updated_at` of a page of items or `current` if newer."""
+    for item in items:
+        updated_at = parse_date(item.get("updated_at"))
+        if updated_at and (current is None or updated_at > current):
+            current = updated_at
+    return current
+
+
+def delete_missing(local, seen: set):
+    """Delete local rows whose key was not seen during a full sync.
+
+    Args:
+        local: Values queryset yielding the primary key followed by the key fields
+        seen (set): Key tuples that were returned by Shopify
+    """
+    stale = [row[0] for row in local.iterator() if row[1:] not in seen]
+    model = local.model
+    for i in range(0, len(stale), BATCH_SIZE):
+        model.objects.filter(pk__in=stale[i : i + BATCH_SIZE]).delete()
+
+
+def _upsert(model, rows: dict, existing: dict, fields: list):
+    """Insert new rows and update existing ones with one query per batch.
+
+    Args:
+        model: Model class that is written
+        rows (dict): Unsaved instances keyed by their lookup key
+        existing (dict): Primary keys of the already stored rows by lookup key
+        fields (list): Fields that are updated on existing rows
+    """
+    new, changed = [], []
+    for key, obj in rows.items():
+        if key in existing:
+            obj.pk = existing[key]
+            changed.append(obj)
+        else:
+            new.append(obj)
+    if new:
+        model.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    if changed:
+        model.objects.bulk_update(changed, fields, batch_size=BATCH_SIZE)
+
+
+def variant_map(inventory_item_ids) -> dict:
+    """Map Shopify inventory item ids to the primary keys of local variants."""
+    return dict(
+        Variant.objects.filter(inventory_item_id__in=inventory_item_ids).values_list(
+            "inventory_item_id", "pk"
+        )
+    )
+
+
+@transaction.atomic
+def upsert_products(products: list, shop=None):
+    """Write a page of Shopify products of `shop` (None for the default store).
+
+    Variants are written for products that carry a `variants` list, variants that
+    are not part of that list anymore are removed.
+    """
+    rows = {
+        p["id"]: Product(
+            id=p["id"],
+            title=p.get("title") or "",
+            vendor=p.get("vendor") or "",
+            product_type=p.get("product_type") or "",
+            handle=p.get("handle") or "",
+            created_at=parse_date(p.get("created_at")),
+            updated_at=parse_date(p.get("updated_at")),
+            published_at=parse_date(p.get("published_at")),
+            shop=shop,
+        )
+        for p in products
+    }
+    existing = Product.objects.filter(id__in=rows.keys()).values_list("id", flat=True)
+    _upsert(Product, rows, {pk: pk for pk in existing}, PRODUCT_FIELDS)
+    upsert_descriptions(
+        {p["id"]: p.get("body_html") or "" for p in products if "body_html" in p}
+    )
+    generation.bump("products")
+
+    with_variants = [p for p in products if "variants" in p]
+    if not with_variants:
+        return
+    variants = [
+        {**var, "product_id": p["id"]} for p in with_variants for var in p["variants"]
+    ]
+    upsert_variants(variants, shop=shop)
+
+    # variants removed from a product in Shopify
+    delete_missing(
+        Variant.objects.filter(
+            product_id__in=[p["id"] for p in with_variants]
+        ).values_list("pk", "inventory_item_id"),
+        {(var["inventory_item_id"],) for var in variants},
+    )
+
+
+def upsert_descriptions(bodies: dict):
+    """Write product descriptions by product id, empty ones are removed."""
+    rows = {
+        pk: ProductDescription(product_id=pk, body_html=body)
+        for pk, body in bodies.items()
+        if body
+    }
+    existing = ProductDescription.objects.filter(pk__in=rows.keys()).values_list(
+        "pk", flat=True
+    )
+    _upsert(ProductDescription, rows, {pk: pk for pk in existing}, ["body_html"])
+    empty = [pk for pk, body in bodies.items() if not body]
+    if empty:
+        ProductDescription.objects.filter(pk__in=empty).delete()
+
+
+def upsert_variants(variants: list, shop=None):
+    """Write a list of Shopify variants, each needs a `product_id`."""
+    rows = {
+        var["inventory_item_id"]: Variant(
+            inventory_item_id=var["inventory_item_id"],
+            shopify_variant_id=var.get("id"),
+            title=var.get("title") or "",
+            sku=var.get("sku") or "",
+            barcode=var.get("barcode") or "",
+            price=var.get("price") or None,
+            created_at=parse_date(var.get("created_at")),
+            updated_at=parse_date(var.get("updated_at")),
+            product_id=var["product_id"],
+            shop=shop,
+        )
+        for var in variants
+    }
+    _upsert(Variant, rows, variant_map(rows.keys()), VARIANT_FIELDS)
+    generation.bump("products")
+
+
+@transaction.atomic
+def upsert_levels(levels: list, shop=None):
+    """Write a page of Shopify inventory levels.
+
+    Levels for inventory items without a local variant are skipped, as are levels
+    that a webhook changed to a newer state after the page was fetched.
+    """
+    variants = variant_map({lvl["inventory_item_id"] for lvl in levels})
+
+    rows = {}
+    for level in levels:
+        variant_id = variants.get(level["inventory_item_id"])
+        if variant_id is None:
+            continue
+        rows[(variant_id, level["location_id"])] = InventoryLevel(
+            variant_id=variant_id,
+            location_id=level["location_id"],
+            available=level.get("available") or 0,
+            updated_at=parse_date(level.get("updated_at")),
+            shop=shop,
+        )
+    # locked until the page is written, webhooks wait and then compare with it
+    existing = {}
+    for variant_id, location_id, pk, updated_at in (
+        InventoryLevel.objects.select_for_update()
+        .filter(variant_id__in=variants.values())
+        .order_by("pk")
+        .values_list("variant_id", "location_id", "pk", "updated_at")
+    ):
+        key = (variant_id, location_id)
+        existing[key] = pk
+        row = rows.get(key)
+        if row and row.updated_at and updated_at and updated_at >= row.updated_at:
+            del rows[key]
+    _upsert(InventoryLevel, rows, existing, LEVEL_FIELDS)
+    generation.bump("levels")
+
+
+def _gid_id(value) -> int:
+    """Get the numeric REST id from a GraphQL global id."""
+    return int(value.rsplit("/", 1)[-1])
+
+
+def _bulk_row(node: dict):
+    """Convert a line of a bulk operation result to the REST format.
+
+    Returns:
+        tuple: Kind of the row (`products`, `variants` or `levels`) and the row
+    """
+    kind = node["id"].split("/")[3]
+    if kind == "Product":
+        return "products", {
+            "id": _gid_id(node["id"]),
+            "title": node.get("title"),
+            "body_html": node.get("descriptionHtml"),
+            "vendor": node.get("vendor"),
+            "product_type": node.get("productType"),
+            "handle": node.get("handle"),
+            "created_at": node.get("createdAt"),
+            "updated_at": node.get("updatedAt"),
+            "published_at": node.get("publishedAt"),
+        }
+    if kind == "ProductVariant":
+        return "variants", {
+            "id": _gid_id(node["id"]),
+            "inventory_item_id": _gid_id(node["inventoryItem"]["id"]),
+            "title": node.get("title"),
+            "sku": node.get("sku"),
+            "barcode": node.get("barcode"),
+            "price": node.get("price"),
+            "created_at": node.get("createdAt"),
+            "updated_at": node.get("updatedAt"),
+            "product_id": _gid_id(node["product"]["id"]),
+        }
+    if kind == "InventoryLevel":
+        quantities = {q["name"]: q["quantity"] for q in node.get("quantities", [])}
+        return "levels", {
+            "inventory_item_id": _gid_id(node["item"]["id"]),
+            "location_id": _gid_id(node["location"]["id"]),
+            "available": quantities.get("available"),
+            "updated_at": node.get("updatedAt"),
+        }
+    return None, None
+
+
+def import_bulk_lines(lines, shop=None) -> dict:
+    """Stream the JSONL result of a bulk operation into the local tables.
+
+    Lines are parsed one by one and written in batches; parents come before their
+    children in the file, so each batch is written in that order too.
+
+    Args:
+        lines: Iterable of JSONL lines (str or bytes), e.g. an open file
+        shop (Shop): Store the data belongs to, None for the default store
+
+    Returns:
+        dict: Newest `updated_at` seen for `products` and `levels`
+    """
+    buffers = {"products": [], "variants": [], "levels": []}
+    writers = {
+        "products": upsert_products,
+        "variants": upsert_variants,
+        "levels": upsert_levels,
+    }
+    watermarks = {"products": None, "levels": None}
+
+    def flush():
+        for kind, rows in buffers.items():
+            if not rows:
+                continue
+            writers[kind](rows, shop=shop)
+            if kind in watermarks:
+                watermarks[kind] = latest_update(rows, watermarks[kind])
+            buffers[kind] = []
+
+    pending = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        kind, row = _bulk_row(json.loads(line))
+        if kind is None:
+            continue
+        buffers[kind].append(row)
+        pending += 1
+        if pending >= BATCH_SIZE:
+            flush()
+            pending = 0
+    flush()
+    return watermarks
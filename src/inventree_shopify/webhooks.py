@@ -0,0 +1,59 @@
+"""Declarative reconciliation of the webhooks registered in Shopify.
+
+The desired state is one webhook per handled topic, each pointing to its own
+local endpoint (`ShopifyWebhook`). Only hooks whose id is stored on an endpoint
+belong to this plugin; other hooks of the shop are never touched.
+"""
+
+
+def webhook_address(host: str, endpoint_id) -> str:
+    """URL under which Shopify delivers the messages of an endpoint."""
+    return f"https://{host}/api/webhook/{endpoint_id}/"
+
+
+def plan(topics, endpoints: list, hooks: list, host: str = None, move=False) -> dict:
+    """Compute the changes that bring the Shopify webhooks into the desired state.
+
+    Args:
+        topics: Topics that should be subscribed
+        endpoints (list): Local endpoints, at least one for every topic
+        hooks (list): Webhooks as returned by Shopify
+        host (str): Host for new hooks, without it missing hooks are not created
+        move (bool): Point existing hooks that use another address to `host`
+
+    Returns:
+        dict: `create` (endpoint, address) and `update` (endpoint, hook id,
+        address) tuples, hook ids to `delete` and the `stale` endpoints that are
+        not needed anymore
+    """
+    hooks = {hook["id"]: hook for hook in hooks}
+    changes = {"create": [], "update": [], "delete": [], "stale": []}
+
+    def live(endpoint):
+        hook = hooks.get(endpoint.shopify_webhook_id)
+        return hook is not None and hook["topic"] == endpoint.topic
+
+    used, kept = set(), set()
+    # endpoints with a working hook go first, duplicates without one are dropped
+    for endpoint in sorted(endpoints, key=lambda endpoint: not live(endpoint)):
+        if endpoint.topic not in topics or endpoint.topic in used:
+            changes["stale"].append(endpoint)
+            continue
+        if live(endpoint):
+            hook = hooks[endpoint.shopify_webhook_id]
+            kept.add(hook["id"])
+            used.add(endpoint.topic)
+            address = webhook_address(host, endpoint.endpoint_id) if host else None
+            if move and address and hook["address"] != address:
+                changes["update"].append((endpoint, hook["id"], address))
+        elif host:
+            used.add(endpoint.topic)
+            address = webhook_address(host, endpoint.endpoint_id)
+            changes["create"].append((endpoint, address))
+        else:
+            changes["stale"].append(endpoint)
+
+    # hooks of this plugin that no endpoint needs anymore
+    ours = {endpoint.shopify_webhook_id for endpoint in endpoints}
+    changes["delete"] = [pk for pk in hooks if pk in ours and pk not in kept]
+    return changes